@@ -0,0 +1,54 @@
+"""The settings layout used before the database rewrite: the parsed json is filtered into a CaselessDict of
+CaselessDicts of the raw setting dicts on every display. Kept only to compare memory use and lookup speed"""
+
+
+class CaselessDict(dict):
+
+    def __init__(self, initval=dict()):
+        super(CaselessDict, self).__init__(initval)
+        for key, value in initval.items():
+            self.__setitem__(key, value)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key.lower())
+
+    def __getitem__(self, key):
+        return dict.__getitem__(self, key.lower())['val']
+
+    def __setitem__(self, key, value):
+        return dict.__setitem__(self, key.lower(), {'key': key, 'val': value})
+
+    def get(self, key, default=None):
+        try:
+            v = dict.__getitem__(self, key.lower())
+        except KeyError:
+            return default
+        else:
+            return v['val']
+
+    def keys(self):
+        return [v['key'] for v in iter(dict.values(self))]
+
+    def values(self):
+        return [v['val'] for v in iter(dict.values(self))]
+
+
+def filteredSettings(settings, gameName, iniFiles):
+    """the former IniEdit.__filteredSettings, settings is the parsed settings.json"""
+    newSettings = CaselessDict()
+    for sectionKey in list(settings.keys()):
+        section = settings[sectionKey]
+        filteredSection = CaselessDict()
+        for key, setting in section.items():
+            setting["value"] = setting["default"]
+            if iniFiles:
+                if "prefs" in setting.get("flags", []):
+                    setting["file"] = iniFiles[1]
+                else:
+                    setting["file"] = iniFiles[0]
+            if "games" in setting and gameName not in setting["games"]:
+                continue
+            filteredSection[str(key)] = setting
+        if len(filteredSection) > 0:
+            newSettings[sectionKey] = filteredSection
+    return newSettings
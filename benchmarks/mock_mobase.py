@@ -0,0 +1,78 @@
+"""Minimal stand-in for the mobase module of Mod Organizer, covering the parts used by the configurator.
+pyCfg imports it when it isn't loaded by Mod Organizer"""
+
+
+class IPluginTool(object):
+
+    def __init__(self):
+        pass
+
+
+class VersionInfo(object):
+
+    def __init__(self, *args):
+        self.args = args
+
+
+class PluginSetting(object):
+
+    def __init__(self, key, description, default):
+        self.key = key
+        self.description = description
+        self.default = default
+
+
+class _Directory(object):
+
+    def __init__(self, path):
+        self.__path = path
+
+    def absolutePath(self):
+        return self.__path
+
+
+class Game(object):
+
+    def __init__(self, shortName, documentsPath):
+        self.__shortName = shortName
+        self.__documents = _Directory(documentsPath)
+
+    def gameShortName(self):
+        return self.__shortName
+
+    def documentsDirectory(self):
+        return self.__documents
+
+
+class Profile(object):
+
+    def __init__(self, path, localSettings=True):
+        self.__path = path
+        self.__localSettings = localSettings
+
+    def absolutePath(self):
+        return self.__path
+
+    def localSettingsEnabled(self):
+        return self.__localSettings
+
+
+class Organizer(object):
+
+    def __init__(self, pluginDataPath, game, profile, settings=None):
+        self.__pluginDataPath = pluginDataPath
+        self.__game = game
+        self.__profile = profile
+        self.__settings = settings or {}
+
+    def pluginDataPath(self):
+        return self.__pluginDataPath
+
+    def managedGame(self):
+        return self.__game
+
+    def profile(self):
+        return self.__profile
+
+    def pluginSetting(self, plugin, key):
+        return self.__settings.get(key)
@@ -0,0 +1,392 @@
+"""Benchmarks of the configurator on synthetic settings databases and ini files. Runs headless, Qt uses the
+offscreen platform.
+
+usage: python benchmarks/run.py [--scales 1,10,100] [--repeat 5] [--compare] [--update-baseline]
+
+Databases are generated at each scale from src/settings.json, ini files with a value for every setting of
+the game are generated for a profile. Each benchmark reports the median of --repeat runs. --compare checks
+the results against baseline.json and exits with 1 if any of them is worse than the baseline by more than
+--tolerance. --update-baseline stores the results as the new baseline. Baselines are only meaningful on the
+machine they were recorded on."""
+
+import os
+import sys
+import gc
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), "src")
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+
+def measure(function, repeat, setup=None):
+    """returns the median wall time of function in seconds. setup is called before every run and not timed,
+its result is passed to function. Without setup, function is run once more before timing to warm up"""
+    if setup is None:
+        function(None)
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        function(state)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+class Workspace(object):
+    """plugin data directory and profile for one scale, in a temporary directory"""
+
+    def __init__(self, root, template, scale, game):
+        import mock_mobase as mobase
+        from pyCfgDatabase import SettingsDatabase, GameRegistry
+        import synthetic
+
+        self.scale = scale
+        self.game = game
+        self.dataPath = os.path.join(root, "data{0}".format(scale))
+        self.profilePath = os.path.join(self.dataPath, "profile")
+        self.originalPath = os.path.join(self.dataPath, "original")
+        os.makedirs(self.profilePath)
+        os.makedirs(self.originalPath)
+        synthetic.writeDatabase(os.path.join(self.dataPath, "settings.json"), template, scale)
+        shutil.copyfile(os.path.join(SOURCE_DIR, "games.json"), os.path.join(self.dataPath, "games.json"))
+
+        self.registry = GameRegistry.load(os.path.join(self.dataPath, "games.json"))
+        self.database = SettingsDatabase(os.path.join(self.dataPath, "settings.json"),
+                                         os.path.join(self.dataPath, "workspace.cache"), self.registry)
+        self.iniFiles = self.database.iniFiles(game)
+        self.lines = synthetic.writeIniFiles(self.originalPath, self.database.gameSections(game), seed=scale)
+        self.resetProfile()
+        self.organizer = mobase.Organizer(self.dataPath, mobase.Game(game, self.profilePath),
+                                          mobase.Profile(self.profilePath))
+
+    def resetProfile(self):
+        for fileName in self.iniFiles:
+            shutil.copyfile(os.path.join(self.originalPath, fileName), os.path.join(self.profilePath, fileName))
+
+    def cachePath(self):
+        return os.path.join(self.dataPath, "pyCfg_settings.cache")
+
+    def plugin(self):
+        import pyCfg
+        plugin = pyCfg.createPlugin()
+        plugin.init(self.organizer)
+        return plugin
+
+
+def benchInit(results, workspace, repeat):
+    import pyCfg
+
+    def removeCache():
+        if os.path.exists(workspace.cachePath()):
+            os.remove(workspace.cachePath())
+        return pyCfg.createPlugin()
+
+    results["init.cold"] = measure(lambda plugin: plugin.init(workspace.organizer), repeat, removeCache)
+    results["init.warm"] = measure(lambda plugin: plugin.init(workspace.organizer), repeat, pyCfg.createPlugin)
+    results["filteredSettings.first"] = measure(lambda plugin: plugin._IniEdit__filteredSettings(), repeat,
+                                                workspace.plugin)
+    plugin = workspace.plugin()
+    plugin._IniEdit__filteredSettings()
+    results["filteredSettings.cached"] = measure(lambda _: plugin._IniEdit__filteredSettings(), repeat)
+
+
+def benchUpdateSettings(results, workspace, repeat):
+    import pyCfgIni
+    from pyCfgDatabase import SettingsOverlay, LayeredValues
+
+    plugin = workspace.plugin()
+    settings = plugin._IniEdit__filteredSettings()
+
+    def fresh():
+        pyCfgIni._parseCache.clear()
+        return SettingsOverlay(), LayeredValues(workspace.iniFiles)
+
+    # the dialog resolves the files as layers
+    for fileName in workspace.iniFiles:
+        if fileName in workspace.lines:
+            results["updateSettings[{0}]".format(fileName)] = measure(
+                lambda state: plugin.updateSettings(settings, state[0], fileName, layers=state[1]), repeat, fresh)
+
+
+def benchSave(results, workspace, repeat):
+    from pyCfgDatabase import SettingsOverlay
+    import synthetic
+
+    plugin = workspace.plugin()
+    settings = plugin._IniEdit__filteredSettings()
+    allSettings = [setting for section in settings.values() for setting in section.values()
+                   if setting.file in workspace.lines]
+    rng = random.Random(workspace.scale)
+    edited = rng.sample(allSettings, min(len(allSettings), max(10, len(allSettings) // 100)))
+
+    def edit():
+        workspace.resetProfile()
+        overlay = SettingsOverlay()
+        for fileName in workspace.iniFiles:
+            plugin.updateSettings(settings, overlay, fileName)
+        changes = {}
+        for setting in edited:
+            overlay.setValue(setting, synthetic.randomValue(setting, rng))
+            if overlay.isModified(setting):
+                changes.setdefault(setting.file, []).append(setting)
+        plugin._IniEdit__overlay = overlay
+        return changes
+
+    results["save"] = measure(lambda changes: plugin._IniEdit__save(changes), repeat, edit)
+    workspace.resetProfile()
+
+
+def benchUpdateTree(results, workspace, repeat):
+    import pyCfg
+    from pyCfgDatabase import SettingsOverlay
+
+    plugin = workspace.plugin()
+    settings = plugin._IniEdit__filteredSettings()
+    window = pyCfg.MainWindow(settings, SettingsOverlay(), categoryCacheSize=0,
+                              searchIndex=workspace.database.searchIndex(workspace.game))
+    ui = window._MainWindow__ui
+    ui.advancedButton.setChecked(True)
+    window._MainWindow__updateCategories()
+    largest = max(settings.keys(), key=lambda section: len(settings[section]))
+    ui.categorySelection.setCurrentIndex(ui.categorySelection.findText(largest))
+    results["updateTree.largest"] = measure(lambda _: window._MainWindow__updateTree(), repeat)
+
+    ui.searchEdit.setText("fov")
+    results["updateTree.search"] = measure(lambda _: window._MainWindow__updateTree(), repeat)
+    window.deleteLater()
+
+
+def benchSliderTick(results, repeat, sizes=(10, 100, 1000, 10000), ticks=200):
+    """time of one value change from an editor, depending on the number of settings in the category"""
+    import pyCfg
+    import synthetic
+    from pyCfgDatabase import CaselessDict, Setting, SettingsOverlay
+
+    for size in sizes:
+        sections = CaselessDict()
+        for section, entries in synthetic.categoryDatabase(size).items():
+            sections[section] = CaselessDict()
+            for key, data in entries.items():
+                sections[section][key] = Setting(section, key, data, "bench.ini")
+        window = pyCfg.MainWindow(sections, SettingsOverlay())
+        ui = window._MainWindow__ui
+        ui.categorySelection.setCurrentIndex(ui.categorySelection.findText("Benchmark"))
+        model = window._MainWindow__model
+        index = model.indexForKey("Benchmark", "i{0}Setting".format(size // 2))
+
+        def tick(_):
+            for value in range(ticks):
+                model.setData(index, value % 100)
+
+        results["sliderTick[{0}]".format(size)] = measure(tick, repeat) / ticks
+        window.deleteLater()
+
+
+def benchSliderDrag(results, repeat, ticks=200, delays=(0, 50)):
+    """one drag of a slider over its range through the editor, committing every step (delay 0) or debounced.
+Besides the time per drag, reports how many commits and window value change handler calls a drag causes"""
+    import pyCfg
+    import synthetic
+    from PyQt6.QtWidgets import QApplication, QSlider
+    from pyCfgDatabase import CaselessDict, Setting, SettingsOverlay
+    from pyCfgProfile import Profiler
+
+    sections = CaselessDict()
+    for section, entries in synthetic.categoryDatabase(100).items():
+        sections[section] = CaselessDict()
+        for key, data in entries.items():
+            sections[section][key] = Setting(section, key, data, "bench.ini")
+    for delay in delays:
+        profiler = Profiler(True, log=lambda line: None)
+        window = pyCfg.MainWindow(sections, SettingsOverlay(), profiler=profiler, commitDelay=delay)
+        ui = window._MainWindow__ui
+        ui.categorySelection.setCurrentIndex(ui.categorySelection.findText("Benchmark"))
+        index = window._MainWindow__model.indexForKey("Benchmark", "i50Setting")
+        ui.settingsTree.openPersistentEditor(index)
+        slider = ui.settingsTree.indexWidget(index).findChild(QSlider)
+
+        def drag(start):
+            for tick in range(ticks):
+                slider.setValue((start or 0) + tick % 101)
+
+        def settle():
+            # lets the last debounced commit of the previous drag happen outside of the timed part
+            time.sleep(delay / 1000.0 * 2)
+            QApplication.processEvents()
+
+        name = "immediate" if delay <= 0 else "debounced"
+        drag(0)
+        settle()
+        profiler.reset()
+        # ends at a different value than the first drag, so the value really changes
+        drag(1)
+        settle()
+        counters = profiler.counters()
+        results["sliderDrag.commits[{0}]".format(name)] = counters.get("editor.commit", 0)
+        results["sliderDrag.handlerCalls[{0}]".format(name)] = counters.get("valueChanged", 0)
+        results["sliderDrag[{0}]".format(name)] = measure(drag, repeat, settle)
+        ui.settingsTree.closePersistentEditor(index)
+        window.deleteLater()
+
+
+def benchParallelLoad(results, workspace, repeat, delay=0.05):
+    """reading the ini files with an artificial delay per file, like on a slow or network drive"""
+    import pyCfg
+
+    paths = [os.path.join(workspace.profilePath, fileName) for fileName in workspace.iniFiles]
+    readIniFile = pyCfg.SettingsLoader.readIniFile
+
+    def delayed(path):
+        time.sleep(delay)
+        return readIniFile(path)
+
+    pyCfg.SettingsLoader.readIniFile = staticmethod(delayed)
+    try:
+        results["load.sequential"] = measure(lambda _: [delayed(path) for path in paths], repeat)
+        results["load.parallel"] = measure(lambda _: pyCfg.SettingsLoader(paths).run(), repeat)
+    finally:
+        pyCfg.SettingsLoader.readIniFile = staticmethod(readIniFile)
+
+
+def benchLayout(results, workspace, repeat, lookups=100000):
+    """memory and lookup time of the settings compared with the layout used before the database rewrite"""
+    import legacy
+    from pyCfgDatabase import SettingsDatabase, SettingsOverlay
+
+    jsonPath = os.path.join(workspace.dataPath, "settings.json")
+
+    def retained(build):
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        value = build()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        return value, size
+
+    def buildLegacy():
+        with open(jsonPath, "r") as f:
+            data = json.load(f)
+        return data, legacy.filteredSettings(data, workspace.game, workspace.iniFiles)
+
+    def buildDatabase():
+        cachePath = os.path.join(workspace.dataPath, "layout.cache")
+        if os.path.exists(cachePath):
+            os.remove(cachePath)
+        database = SettingsDatabase(jsonPath, cachePath, workspace.registry)
+        # like the plugin, only the managed game is indexed
+        database.load([workspace.game])
+        return database, database.gameSections(workspace.game)
+
+    (_, legacySettings), results["memory.legacy"] = retained(buildLegacy)
+    (_, settings), results["memory.database"] = retained(buildDatabase)
+
+    rng = random.Random(0)
+    keys = [(section, key) for section in settings.keys() for key in settings[section].keys()]
+    keys = [(section.upper(), key.lower()) for section, key in rng.choices(keys, k=lookups)]
+    overlay = SettingsOverlay()
+
+    def lookupLegacy(_):
+        for section, key in keys:
+            legacySettings[section][key]["value"]
+
+    def lookupDatabase(_):
+        for section, key in keys:
+            overlay.value(settings[section][key])
+
+    results["lookup.legacy"] = measure(lookupLegacy, repeat) / lookups
+    results["lookup.database"] = measure(lookupDatabase, repeat) / lookups
+
+
+def compare(results, baseline, tolerance):
+    """prints the results next to the baseline, returns the names of the results that regressed"""
+    regressions = []
+    for name, value in results.items():
+        reference = baseline.get(name)
+        if reference is None or reference <= 0:
+            print("{0:<45} {1:>14.6g}".format(name, value))
+            continue
+        ratio = value / reference
+        flag = ""
+        if ratio > 1.0 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("{0:<45} {1:>14.6g} {2:>14.6g} {3:>7.2f}x{4}".format(name, value, reference, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the configurator benchmarks")
+    parser.add_argument("--scales", default="1,10,100", help="comma separated sizes of the synthetic databases")
+    parser.add_argument("--game", default="skyrim", help="game whose settings are used")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark, the median is reported")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file")
+    parser.add_argument("--compare", action="store_true", help="fail if results are worse than the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown against the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    workRoot = tempfile.mkdtemp(prefix="pyCfgBench")
+    sys.path[:0] = [workRoot, BENCHMARK_DIR, SOURCE_DIR]
+    try:
+        # the dialog class is generated from the ui file like in the build
+        from PyQt6 import uic
+        from PyQt6.QtCore import qInstallMessageHandler
+        from PyQt6.QtWidgets import QApplication
+        with open(os.path.join(SOURCE_DIR, "pyCfgDialog.ui"), "r", encoding="utf-8") as source,\
+                open(os.path.join(workRoot, "pyCfgDialog.py"), "w", encoding="utf-8") as target:
+            uic.compileUi(source, target)
+        application = QApplication.instance() or QApplication([])
+        # the plugin logs every problem in the generated ini files
+        qInstallMessageHandler(lambda *args: None)
+
+        with open(os.path.join(SOURCE_DIR, "settings.json"), "r") as f:
+            template = json.load(f)
+
+        results = {}
+        for scale in [int(scale) for scale in args.scales.split(",") if scale]:
+            workspace = Workspace(workRoot, template, scale, args.game)
+            scaleResults = {}
+            benchInit(scaleResults, workspace, args.repeat)
+            benchUpdateSettings(scaleResults, workspace, args.repeat)
+            benchSave(scaleResults, workspace, args.repeat)
+            benchUpdateTree(scaleResults, workspace, args.repeat)
+            benchParallelLoad(scaleResults, workspace, args.repeat)
+            benchLayout(scaleResults, workspace, args.repeat)
+            for name, value in scaleResults.items():
+                results["{0}[x{1}]".format(name, scale)] = value
+        benchSliderTick(results, args.repeat)
+        benchSliderDrag(results, args.repeat)
+        application.processEvents()
+
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r") as f:
+                baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+
+        if args.update_baseline:
+            with open(args.baseline, "w") as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+                f.write("\n")
+        if args.compare and regressions:
+            print("{0} benchmark(s) slower than the baseline".format(len(regressions)), file=sys.stderr)
+            return 1
+        return 0
+    finally:
+        shutil.rmtree(workRoot, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
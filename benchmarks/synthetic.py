@@ -0,0 +1,84 @@
+"""Generators for synthetic settings databases and ini files. Everything is derived from the settings.json
+shipped with the plugin and a seed, so the same arguments always produce the same files"""
+
+import os
+import json
+import random
+
+# games the copies of game specific settings are spread over
+GAMES = ["skyrim", "skyrimse", "fallout3", "falloutnv", "fallout4", "oblivion"]
+
+
+def generateDatabase(template, scale, games=GAMES):
+    """returns a settings database scale times the size of template. Each section is copied scale times,
+copies get a numbered suffix. Settings limited to some games are assigned to a different game in each copy,
+settings for all games stay that way"""
+    result = {}
+    for copy in range(scale):
+        suffix = "" if copy == 0 else str(copy)
+        for section, settings in template.items():
+            entries = result.setdefault(section + suffix, {})
+            for key, data in settings.items():
+                data = dict(data)
+                if copy > 0 and "games" in data:
+                    data["games"] = [games[(games.index(game) + copy) % len(games)] if game in games else game
+                                     for game in data["games"]]
+                entries[key] = data
+    return result
+
+
+def writeDatabase(path, template, scale, games=GAMES):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(generateDatabase(template, scale, games), f)
+
+
+def categoryDatabase(size, section="Benchmark"):
+    """returns a database with a single section of size integer settings, for all games"""
+    return {section: {"i{0}Setting".format(index): {"default": 50, "range": {"lower": 0, "upper": 100},
+                                                    "flags": ["basic"]}
+                      for index in range(size)}}
+
+
+def randomValue(setting, rng):
+    if setting.values is not None:
+        return rng.choice(setting.values)
+    if setting.type == 'b':
+        return rng.random() < 0.5
+    elif setting.type in ('i', 'u'):
+        lower, upper = setting.range if setting.range is not None else (0, 1000)
+        return rng.randint(int(lower), int(upper))
+    elif setting.type == 'f':
+        lower, upper = setting.range if setting.range is not None else (0.0, 1000.0)
+        return round(rng.uniform(lower, upper), 4)
+    return setting.default
+
+
+def writeIniFiles(directory, sections, seed=0, noise=0.1):
+    """writes an ini file for every file the settings in sections (as returned by
+SettingsDatabase.gameSections()) belong to, with a random valid value for each setting. noise is the ratio
+of comments, blank lines and unknown settings mixed in. Returns the number of lines per file"""
+    rng = random.Random(seed)
+    files = {}
+    for section, settings in sections.items():
+        for setting in settings.values():
+            if setting.file is None:
+                continue
+            value = randomValue(setting, rng)
+            if isinstance(value, bool):
+                value = "1" if value else "0"
+            lines = files.setdefault(setting.file, {}).setdefault(section, [])
+            lines.append("{0}={1}".format(setting.key, value))
+            if rng.random() < noise:
+                lines.append(rng.choice(["; generated comment", "", "sUnknownSetting{0}=x".format(len(lines))]))
+
+    counts = {}
+    for fileName, fileSections in files.items():
+        count = 0
+        with open(os.path.join(directory, fileName), "w", encoding="utf-8", newline="\r\n") as f:
+            for section, lines in fileSections.items():
+                f.write("[{0}]\n".format(section))
+                f.write("\n".join(lines))
+                f.write("\n\n")
+                count += len(lines) + 2
+        counts[fileName] = count
+    return counts
@@ -1,89 +1,503 @@
 import os
 import sys
-import json
-import configparser
+import time
+import collections
+from concurrent.futures import ThreadPoolExecutor
 
 # qt5
 from PyQt6 import QtCore, QtGui, QtWidgets
 from PyQt6.QtCore import Qt, QCoreApplication, pyqtSlot, pyqtSignal
-from PyQt6.QtGui import QColor, QPalette
-from PyQt6.QtWidgets import QDialog, QHeaderView, QMessageBox, QColorDialog, QTreeWidgetItem,\
-    QComboBox, QPushButton, QDoubleSpinBox, QHBoxLayout, QWidget, QSlider, QSpinBox, QLineEdit
+from PyQt6.QtGui import QColor
+from PyQt6.QtWidgets import QDialog, QHeaderView, QMessageBox, QColorDialog, QAbstractItemView, QStyledItemDelegate,\
+    QComboBox, QDoubleSpinBox, QHBoxLayout, QWidget, QSlider, QSpinBox, QLineEdit, QApplication, QStyle, QInputDialog
 
 if "mobase" not in sys.modules:
     import mock_mobase as mobase
 
+from pyCfgDatabase import SettingsDatabase, SettingsOverlay, GameRegistry, LayeredValues, CUSTOM, applyIniRecords,\
+    iniFileValues, writeSettings
+from pyCfgLint import UNEXPECTED_SECTION, UNKNOWN_SETTING, WRONG_FILE, ERRORS, describeIssue
+from pyCfgIni import parseIniFile
+from pyCfgProfile import Profiler, createProfiler
+from pyCfgHistory import HISTORY_DIRECTORY, SettingsHistory
 
-class CaselessDict(dict):
-    """Dictionary that enables case insensitive searching while preserving case sensitivity
-when keys are listed, ie, via keys() or items() methods.
+# decimals shown by the editor of float settings, more are shown if the value has them
+FLOAT_DECIMALS = 6
 
-Works by storing a lowercase version of the key as the new key and stores the original key-value
-pair as the key's value (values become dictionaries)."""
 
-    def __init__(self, initval=dict()):
-        super(CaselessDict, self).__init__(initval)
-        if isinstance(initval, dict):
-            for key, value in initval.items():
-                self.__setitem__(key, value)
-        elif isinstance(initval, list):
-            for (key, value) in initval:
-                self.__setitem__(key, value)
+def colorFromValue(value):
+    try:
+        rgb = [int(col) for col in str(value).split(",")]
+        return QColor(rgb[0],  rgb[1],  rgb[2])
+    except (ValueError, IndexError):
+        return QColor(0,  0,  0)
 
-    def __contains__(self, key):
-        return dict.__contains__(self, key.lower())
 
-    def __getitem__(self, key):
-        return dict.__getitem__(self, key.lower())['val']
+def floatDecimals(value,  maxDecimals=10):
+    """returns the number of decimals needed to show value without rounding, at most maxDecimals"""
+    text = "{0:.{1}f}".format(value,  maxDecimals).rstrip("0")
+    return len(text) - text.index(".") - 1
 
-    def __setitem__(self, key, value):
-        return dict.__setitem__(self, key.lower(), {'key': key, 'val': value})
 
-    def updateKey(self,  key):
-        dict.__getitem__(self,  key.lower())['key'] = key
+class SettingsModel(QtCore.QAbstractTableModel):
+    """Item model over the visible settings of one category. Editors are only created by
+SettingDelegate when a row is actually edited."""
 
-    def get(self, key, default=None):
-        try:
-            v = dict.__getitem__(self, key.lower())
-        except KeyError:
-            return default
-        else:
-            return v['val']
-
-    def has_key(self, key):
-        if self.get(key):
-            return True
-        else:
-            return False
+    valueChanged = pyqtSignal(str, str)
 
-    def items(self):
-        return [(v['key'], v['val']) for v in iter(dict.values(self))]
+    def __init__(self,  overlay,  parent=None):
+        super(SettingsModel,  self).__init__(parent)
+        self.__overlay = overlay
+        self.__category = ""
+        self.__rows = []
+        self.__rowByKey = {}
+        self.__readOnly = False
+        self.__showSection = False
+        self.__conflicts = set()
+        self.__layers = None
+        self.__targetFile = None
+        # icons by resource name, data() is called for every visible row on each repaint
+        self.__icons = {}
 
-    def keys(self):
-        return [v['key'] for v in iter(dict.values(self))]
+    def tr(self, str):
+        return QCoreApplication.translate("MainWindow", str)
 
-    def values(self):
-        return [v['val'] for v in iter(dict.values(self))]
+    def __icon(self,  name):
+        icon = self.__icons.get(name)
+        if icon is None:
+            if name == "warning":
+                icon = QApplication.style().standardIcon(QStyle.StandardPixmap.SP_MessageBoxWarning)
+            else:
+                icon = QtGui.QIcon("pyCfg:" + name)
+            self.__icons[name] = icon
+        return icon
+
+    def setRows(self,  category,  rows,  showSection=False):
+        """replaces the displayed settings with rows, a list of Setting objects. If showSection is set, the
+section is displayed next to the key, for rows from different categories"""
+        self.beginResetModel()
+        self.__category = category
+        self.__rows = rows
+        self.__showSection = showSection
+        # rows from different sections may share a key name, so rows are looked up by section and key
+        self.__rowByKey = {(setting.section.lower(), setting.key.lower()): row for row, setting in enumerate(rows)}
+        self.endResetModel()
+
+    def setting(self,  index):
+        return self.__rows[index.row()]
+
+    def setReadOnly(self,  readOnly):
+        self.__readOnly = readOnly
+
+    def setConflicts(self,  conflicts):
+        """conflicts is the set of settings that were changed in their ini file while they had unsaved edits"""
+        self.__conflicts = conflicts
+
+    def setLayers(self,  layers,  targetFile):
+        """adds a column showing the file the value of each setting comes from, taken from layers, or the
+file targetFile(setting) returns for edited settings"""
+        self.beginResetModel()
+        self.__layers = layers
+        self.__targetFile = targetFile
+        self.endResetModel()
+
+    def settingForKey(self,  section,  key):
+        row = self.__rowByKey.get((section.lower(),  key.lower()))
+        return None if row is None else self.__rows[row]
+
+    def indexForKey(self,  section,  key,  column=1):
+        row = self.__rowByKey.get((section.lower(),  key.lower()))
+        return QtCore.QModelIndex() if row is None else self.index(row,  column)
+
+    def refreshAll(self):
+        if self.__rows:
+            self.dataChanged.emit(self.index(0,  0),  self.index(len(self.__rows) - 1,  self.columnCount() - 1))
+
+    def refreshKey(self,  section,  key):
+        """notifies the view that the value of a setting was changed outside of the model"""
+        row = self.__rowByKey.get((section.lower(),  key.lower()))
+        if row is not None:
+            self.dataChanged.emit(self.index(row,  0),  self.index(row,  self.columnCount() - 1))
+
+    def rowCount(self,  parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.__rows)
+
+    def columnCount(self,  parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else 2 if self.__layers is None else 3
+
+    def headerData(self,  section,  orientation,  role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return QCoreApplication.translate("PyCfgDialog", ("Key", "Value", "Source")[section])
+        return None
+
+    def flags(self,  index):
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.column() == 1 and not self.__readOnly:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def data(self,  index,  role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        setting = self.__rows[index.row()]
+        if index.column() == 0:
+            if role == Qt.ItemDataRole.DisplayRole:
+                if self.__showSection:
+                    return "{0} [{1}]".format(setting.key,  setting.section)
+                return setting.key
+            elif role == Qt.ItemDataRole.DecorationRole:
+                if setting in self.__conflicts:
+                    return self.__icon("warning")
+                if self.__overlay.isModified(setting):
+                    return self.__icon("not-synchronized.png")
+                return self.__icon("empty.png")
+            elif role == Qt.ItemDataRole.ToolTipRole:
+                if setting in self.__conflicts:
+                    return self.tr("This setting was changed outside of the configurator after you edited it")
+                if setting.description is not None:
+                    return str(self.tr(setting.description))
+            return None
+
+        if index.column() == 2:
+            if role == Qt.ItemDataRole.DisplayRole:
+                if self.__overlay.isModified(setting):
+                    return self.tr("to {0}").format(self.__targetFile(setting))
+                source = self.__layers.source(setting)
+                return self.tr("default") if source is None else source
+            elif role == Qt.ItemDataRole.ToolTipRole:
+                if self.__overlay.isModified(setting):
+                    return self.tr("The changed value will be saved to this file")
+                return self.tr("The file the current value comes from, files later in the load order override earlier ones")
+            return None
+
+        value = self.__overlay.value(setting)
+        keyType = None if setting.values is not None else setting.type
+        if role == Qt.ItemDataRole.DisplayRole:
+            if keyType == 'b':
+                return self.tr("true") if value else self.tr("false")
+            return str(value)
+        elif role == Qt.ItemDataRole.EditRole:
+            return value
+        elif role == Qt.ItemDataRole.DecorationRole:
+            if keyType == 'b':
+                return self.__icon("true.png" if value else "false.png")
+            elif keyType == 'r':
+                return colorFromValue(value)
+        elif role == Qt.ItemDataRole.ToolTipRole:
+            return self.tr("Default: ") + str(setting.default)
+        return None
 
-    def iteritems(self):
-        for v in iter(dict.values(self)):
-            yield v['key'], v['val']
+    def setData(self,  index,  value,  role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        setting = self.__rows[index.row()]
+        if self.__overlay.value(setting) == value:
+            return True
+        self.__overlay.setValue(setting,  value)
+        self.dataChanged.emit(self.index(index.row(),  0),  self.index(index.row(),  self.columnCount() - 1))
+        self.valueChanged.emit(setting.section,  setting.key)
+        return True
 
-    def iterkeys(self):
-        for v in iter(dict.values(self)):
-            yield v['key']
 
-    def itervalues(self):
-        for v in iter(dict.values(self)):
-            yield v['val']
+class SliderEditor(QWidget):
+    """Slider with an attached spin box, used for integer settings with a range"""
+
+    valueChanged = pyqtSignal(int)
+
+    def __init__(self,  range,  step,  parent=None):
+        super(SliderEditor,  self).__init__(parent)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0,  0,  0,  0)
+        self.__slider = QSlider(Qt.Orientation.Horizontal,  self)
+        self.__spin = QSpinBox(self)
+        self.__slider.setRange(range[0],  range[1])
+        self.__spin.setRange(range[0],  range[1])
+        self.__slider.setSingleStep(step)
+        self.__spin.setSingleStep(step)
+        layout.addWidget(self.__slider,  1)
+        layout.addWidget(self.__spin)
+        self.__slider.valueChanged.connect(self.__spin.setValue)
+        self.__spin.valueChanged.connect(self.__slider.setValue)
+        self.__spin.valueChanged.connect(self.valueChanged)
+        self.setAutoFillBackground(True)
+        self.setFocusProxy(self.__spin)
+
+    def value(self):
+        return self.__spin.value()
+
+    def setValue(self,  value):
+        self.__slider.blockSignals(True)
+        self.__spin.blockSignals(True)
+        self.__slider.setValue(value)
+        self.__spin.setValue(value)
+        self.__slider.blockSignals(False)
+        self.__spin.blockSignals(False)
+
+
+class SettingDelegate(QStyledItemDelegate):
+    """Creates the editor widget for a setting only while its value is being edited. Booleans
+and colors don't need an editor, they are changed by clicking the value or pressing space or enter on
+their row.
+
+Values of sliders and spin boxes are committed once they haven't changed for delay milliseconds, so
+dragging a slider over its range commits the value it stops at instead of every step. A delay of 0
+commits every change right away"""
+
+    def __init__(self,  parent=None,  delay=50,  profiler=None):
+        super(SettingDelegate,  self).__init__(parent)
+        self.__delay = delay
+        self.__profiler = profiler if profiler is not None else Profiler()
+        # editor -> its commit timer, for editors with changes that weren't committed yet
+        self.__pending = {}
+        # editor -> the value it showed when it was opened. Editors are opened by just moving the selection,
+        # so an editor that still shows it must not write it back, it may be rounded or clamped by the editor
+        self.__opened = {}
+
+    def createEditor(self,  parent,  option,  index):
+        setting = index.model().setting(index)
+        if setting.values is not None:
+            editor = QComboBox(parent)
+            for val in setting.values:
+                editor.addItem(str(val),  val)
+            editor.currentIndexChanged[int].connect(self.__commit)
+            return editor
+
+        keyType = setting.type
+        if keyType == 'b' or keyType == 'r':
+            return None
+        elif keyType == 'f':
+            editor = QDoubleSpinBox(parent)
+            editor.setDecimals(FLOAT_DECIMALS)
+            if setting.range is not None:
+                editor.setRange(setting.range[0],  setting.range[1])
+            else:
+                editor.setRange(-sys.float_info.max,  sys.float_info.max)
+            editor.setSingleStep(1.0 if setting.step is None else setting.step)
+            self.__debounce(editor)
+        elif keyType == 'i' or keyType == 'u':
+            if setting.range is not None:
+                editor = SliderEditor(setting.range,  1 if setting.step is None else setting.step,  parent)
+            else:
+                editor = QSpinBox(parent)
+                if keyType == 'i':
+                    editor.setRange(-2147483648,  2147483647)
+                else:
+                    editor.setRange(0,  2147483647)
+                editor.setSingleStep(1 if setting.step is None else setting.step)
+            self.__debounce(editor)
+        else:
+            editor = QLineEdit(parent)
+            editor.editingFinished.connect(self.__commit)
+        return editor
+
+    def setEditorData(self,  editor,  index):
+        value = index.data(Qt.ItemDataRole.EditRole)
+        editor.blockSignals(True)
+        if isinstance(editor,  QComboBox):
+            if editor.findData(value) == -1:
+                # values outside of the list are only warned about when loading, keep them selectable
+                editor.addItem(str(value),  value)
+            editor.setCurrentIndex(editor.findData(value))
+        elif isinstance(editor,  QLineEdit):
+            editor.setText(str(value))
+        else:
+            if isinstance(editor,  QDoubleSpinBox):
+                editor.setDecimals(max(editor.decimals(),  floatDecimals(value)))
+            editor.setValue(value)
+        editor.blockSignals(False)
+        self.__opened[editor] = SettingDelegate.__editorValue(editor)
+
+    def setModelData(self,  editor,  model,  index):
+        value = SettingDelegate.__editorValue(editor)
+        if editor in self.__opened and self.__opened[editor] == value:
+            return
+        model.setData(index,  value)
+        self.__opened[editor] = value
+
+    @staticmethod
+    def __editorValue(editor):
+        if isinstance(editor,  QComboBox):
+            return editor.currentData()
+        elif isinstance(editor,  QLineEdit):
+            return str(editor.text())
+        return editor.value()
+
+    def editorEvent(self,  event,  model,  option,  index):
+        if event.type() == QtCore.QEvent.Type.MouseButtonRelease:
+            activated = index.column() == 1 and event.button() == Qt.MouseButton.LeftButton
+        elif event.type() == QtCore.QEvent.Type.KeyPress:
+            # rows are selected as a whole, the current index is usually the key
+            activated = event.key() in (Qt.Key.Key_Space,  Qt.Key.Key_Enter,  Qt.Key.Key_Return)
+            index = index.sibling(index.row(),  1)
+        else:
+            activated = False
+        if activated and model.flags(index) & Qt.ItemFlag.ItemIsEditable:
+            setting = model.setting(index)
+            if setting.values is None:
+                if setting.type == 'b':
+                    model.setData(index,  not index.data(Qt.ItemDataRole.EditRole))
+                    return True
+                elif setting.type == 'r':
+                    col = QColorDialog.getColor(colorFromValue(index.data(Qt.ItemDataRole.EditRole)),  option.widget)
+                    if col.isValid():
+                        model.setData(index,  str(col.red()) + "," + str(col.green()) + "," + str(col.blue()))
+                    return True
+        return super(SettingDelegate,  self).editorEvent(event,  model,  option,  index)
+
+    def destroyEditor(self,  editor,  index):
+        # the view commits the value before closing an editor unless the edit is cancelled
+        self.__pending.pop(editor,  None)
+        self.__opened.pop(editor,  None)
+        super(SettingDelegate,  self).destroyEditor(editor,  index)
+
+    def commitPending(self):
+        """commits the values of editors whose delay hasn't passed yet"""
+        for editor in list(self.__pending):
+            self.__commitPending(editor)
+
+    def __debounce(self,  editor):
+        if self.__delay <= 0:
+            editor.valueChanged.connect(self.__commit)
+            return
+        timer = QtCore.QTimer(editor)
+        timer.setSingleShot(True)
+        timer.setInterval(self.__delay)
+        timer.timeout.connect(lambda: self.__commitPending(editor))
+        editor.valueChanged.connect(lambda value: self.__editorChanged(editor,  timer))
+
+    def __editorChanged(self,  editor,  timer):
+        self.__profiler.count("editor.valueChanged")
+        self.__pending[editor] = timer
+        timer.start()
+
+    def __commitPending(self,  editor):
+        timer = self.__pending.pop(editor,  None)
+        if timer is not None:
+            timer.stop()
+            self.__profiler.count("editor.commit")
+            self.commitData.emit(editor)
+
+    def __commit(self):
+        self.__profiler.count("editor.valueChanged")
+        self.__profiler.count("editor.commit")
+        self.commitData.emit(self.sender())
+
+
+class SettingsLoader(QtCore.QThread):
+    """Reads and parses ini files in the background. loaded is emitted with the records of each file, in the
+order of paths, or None for files that couldn't be read"""
+
+    loaded = pyqtSignal(list)
+
+    def __init__(self,  paths,  parent=None):
+        super(SettingsLoader,  self).__init__(parent)
+        self.__paths = paths
+
+    @staticmethod
+    def readIniFile(filePath):
+        try:
+            return parseIniFile(filePath)
+        except OSError:
+            return None
+
+    def run(self):
+        # the files are read concurrently since profiles may be on slow drives
+        with ThreadPoolExecutor(max_workers=max(len(self.__paths),  1)) as pool:
+            self.loaded.emit(list(pool.map(SettingsLoader.readIniFile,  self.__paths)))
+
+
+class IniFileWatcher(QtCore.QObject):
+    """Reports ini files that were changed outside of the configurator. Notifications are coalesced and only
+reported if the modification time or size of the file actually changed. Files replaced by renaming, which is
+how most editors and patchIniFile save, drop out of QFileSystemWatcher and are added again"""
+
+    fileChanged = pyqtSignal(str)
+
+    def __init__(self,  paths,  parent=None,  delay=200):
+        super(IniFileWatcher,  self).__init__(parent)
+        self.__signatures = {path: IniFileWatcher.__signature(path) for path in paths}
+        self.__pending = set()
+        self.__timer = QtCore.QTimer(self)
+        self.__timer.setSingleShot(True)
+        self.__timer.setInterval(delay)
+        self.__timer.timeout.connect(self.__emitPending)
+        self.__watcher = QtCore.QFileSystemWatcher(self)
+        self.__watcher.fileChanged.connect(self.__fileChanged)
+        # the directories are watched as well to notice files that are created or replaced
+        self.__watcher.directoryChanged.connect(self.__directoryChanged)
+        self.__watch()
+
+    @staticmethod
+    def __signature(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns,  stat.st_size)
+
+    def __watch(self):
+        files = set(self.__watcher.files())
+        directories = set(self.__watcher.directories())
+        for path in self.__signatures:
+            if path not in files and os.path.exists(path):
+                self.__watcher.addPath(path)
+            directory = os.path.dirname(path)
+            if directory not in directories and os.path.isdir(directory):
+                self.__watcher.addPath(directory)
+                directories.add(directory)
+
+    def acknowledge(self,  path):
+        """marks the current state of the file at path as known, for changes made by the configurator itself"""
+        self.__signatures[path] = IniFileWatcher.__signature(path)
+        self.__pending.discard(path)
+
+    def __fileChanged(self,  path):
+        if path in self.__signatures:
+            self.__pending.add(path)
+            self.__timer.start()
+
+    def __directoryChanged(self,  directory):
+        self.__pending.update(path for path in self.__signatures if os.path.dirname(path) == directory)
+        self.__timer.start()
+
+    def __emitPending(self):
+        self.__watch()
+        pending = sorted(self.__pending)
+        self.__pending.clear()
+        for path in pending:
+            signature = IniFileWatcher.__signature(path)
+            if signature != self.__signatures[path]:
+                self.__signatures[path] = signature
+                self.fileChanged.emit(path)
 
 
 class MainWindow(QDialog):
     saveSettings = pyqtSignal(dict)
-
-    def __init__(self,  settings,  parent=None):
+    firstPainted = pyqtSignal()
+    undoRequested = pyqtSignal()
+    redoRequested = pyqtSignal()
+    # time of the save the ini files are to be returned to
+    restoreRequested = pyqtSignal(float)
+
+    def __init__(self,  settings,  overlay,  parent=None,  categoryCacheSize=8,  searchIndex=None,  profiler=None,
+                 layers=None,  history=None,  commitDelay=50):
         super(MainWindow,  self).__init__(parent)
         self.__settings = settings
+        self.__layers = layers
+        self.__history = history
+        self.__loading = False
+        self.__profiler = profiler if profiler is not None else Profiler()
+        self.__overlay = overlay
+        self.__searchIndex = searchIndex
+        # least recently used rows per (category, advanced), so switching back to a category doesn't rebuild it.
+        # Rows only reference the settings, values are read from the overlay, so they never go stale
+        self.__categoryCache = collections.OrderedDict()
+        self.__categoryCacheSize = categoryCacheSize
+        # settings that differ from the saved value
+        self.__dirty = set()
+        # settings changed in their ini file while they had unsaved edits
+        self.__conflicts = set()
+        self.__painted = False
         from pyCfgDialog import Ui_PyCfgDialog
 
         self.__ui = Ui_PyCfgDialog()
@@ -91,20 +505,130 @@ class MainWindow(QDialog):
 
         self.setWindowFlags(self.windowFlags() & ~Qt.WindowType.WindowContextHelpButtonHint)
 
+        self.__model = SettingsModel(overlay,  self)
+        self.__model.setConflicts(self.__conflicts)
+        self.__model.valueChanged.connect(self.__valueChanged)
+        self.__ui.settingsTree.setModel(self.__model)
+        self.__delegate = SettingDelegate(self.__ui.settingsTree,  commitDelay,  self.__profiler)
+        self.__ui.settingsTree.setItemDelegate(self.__delegate)
+        # the view only passes space to the delegate, enter is let through to toggle booleans and pick colors
+        self.__ui.settingsTree.installEventFilter(self)
+        self.__ui.settingsTree.setEditTriggers(QAbstractItemView.EditTrigger.CurrentChanged
+                                               | QAbstractItemView.EditTrigger.SelectedClicked
+                                               | QAbstractItemView.EditTrigger.EditKeyPressed)
+
+        self.__lastSelectedCategory = ""
         self.__updateCategories()
         self.__ui.categorySelection.currentIndexChanged[int].connect(self.__sectionChanged)
         self.__ui.advancedButton.clicked.connect(self.__advancedClicked)
         self.__ui.saveButton.clicked.connect(self.__save)
+        self.__ui.searchEdit.setVisible(searchIndex is not None)
+        self.__ui.searchEdit.textChanged.connect(self.__searchChanged)
+        if layers is not None:
+            self.__model.setLayers(layers,  self.__targetFile)
+            self.__ui.layerSelection.currentIndexChanged[int].connect(lambda index: self.__model.refreshAll())
+            self.__updateLayerSelection()
+            self.__ui.settingsTree.header().setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents)
+        self.__ui.layerLabel.setVisible(layers is not None)
+        self.__ui.layerSelection.setVisible(layers is not None)
+        self.__ui.undoButton.clicked.connect(self.undoRequested)
+        self.__ui.redoButton.clicked.connect(self.redoRequested)
+        self.__ui.historyButton.clicked.connect(self.__historyClicked)
+        for button in (self.__ui.undoButton,  self.__ui.redoButton,  self.__ui.historyButton):
+            button.setVisible(history is not None)
         self.__ui.settingsTree.header().setSectionResizeMode(0, QHeaderView.ResizeMode.Interactive)
         self.__ui.settingsTree.header().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
 
-        self.__lastSelectedCategory = ""
         self.__ui.closeButton.clicked.connect(self.close)
+        self.__title = self.windowTitle()
 
     def tr(self, str):
         return QCoreApplication.translate("MainWindow", str)
 
+    def setLoading(self,  loading):
+        """while loading, the values in settings are incomplete and can't be edited"""
+        self.__model.setReadOnly(loading)
+        self.__loading = loading
+        self.historyChanged()
+        if loading:
+            self.setWindowTitle(self.tr("{0} (loading...)").format(self.__title))
+        else:
+            self.setWindowTitle(self.__title)
+            self.__updateLayerSelection()
+            self.__model.refreshAll()
+
+    def __updateLayerSelection(self):
+        if self.__layers is None:
+            return
+        selection = self.__ui.layerSelection
+        current = selection.currentData()
+        selection.blockSignals(True)
+        selection.clear()
+        selection.addItem(self.tr("Automatic"),  None)
+        for fileName in self.__layers.fileNames():
+            if self.__layers.exists(fileName):
+                selection.addItem(fileName,  fileName)
+        selection.setCurrentIndex(max(selection.findData(current),  0))
+        selection.blockSignals(False)
+
+    def historyChanged(self):
+        """updates the undo, redo and history buttons, they are disabled while loading and while there are
+unsaved edits"""
+        if self.__history is None:
+            return
+        enabled = not self.__loading and not self.__dirty
+        self.__ui.undoButton.setEnabled(enabled and self.__history.canUndo())
+        self.__ui.redoButton.setEnabled(enabled and self.__history.canRedo())
+        self.__ui.historyButton.setEnabled(enabled and (self.__history.canUndo() or self.__history.canRedo()))
+
+    def __historyClicked(self):
+        entries = self.__history.entries()
+        position = self.__history.position()
+        # newest first, each item returns the files to the state after that save. The labels contain the
+        # entry id since the choice is only returned as text and saves may happen within the same second
+        items = []
+        times = []
+        for index, entry in reversed(list(enumerate(entries))):
+            items.append(self.tr("#{0} {1}: {2} setting(s){3}").format(
+                entry.id,  time.strftime("%Y-%m-%d %H:%M:%S",  time.localtime(entry.time)),  len(entry.changes),
+                self.tr(" (current)") if index + 1 == position else ""))
+            times.append(entry.time)
+        items.append(self.tr("Before the first recorded save{0}").format(self.tr(" (current)") if position == 0 else ""))
+        times.append(entries[0].time - 1.0)
+        item, ok = QInputDialog.getItem(self,  self.tr("Restore settings"),
+                                        self.tr("Return the ini files to the state after this save:"),
+                                        items,  len(entries) - position,  False)
+        if ok:
+            index = items.index(item)
+            if index != len(entries) - position:
+                self.restoreRequested.emit(times[index])
+
+    def __targetFile(self,  setting):
+        """returns the ini file an edit of setting is saved to: the selected one or, if automatic is selected,
+the file its current value comes from"""
+        if self.__layers is None:
+            return setting.file
+        selected = self.__ui.layerSelection.currentData()
+        if selected is not None:
+            return selected
+        return self.__layers.source(setting) or setting.file
+
+    def eventFilter(self,  watched,  event):
+        if watched is self.__ui.settingsTree and event.type() == QtCore.QEvent.Type.KeyPress\
+                and event.key() in (Qt.Key.Key_Enter,  Qt.Key.Key_Return) and self.__ui.settingsTree.currentIndex().isValid():
+            tree = self.__ui.settingsTree
+            if tree.edit(tree.currentIndex(),  QAbstractItemView.EditTrigger.AnyKeyPressed,  event):
+                return True
+        return super(MainWindow,  self).eventFilter(watched,  event)
+
+    def paintEvent(self,  event):
+        super(MainWindow,  self).paintEvent(event)
+        if not self.__painted:
+            self.__painted = True
+            self.firstPainted.emit()
+
     def closeEvent(self,  event):
+        self.__delegate.commitPending()
         if self.__ui.saveButton.isEnabled():
             res = QMessageBox.question(self,  self.tr("Unsaved changes"),
                                        self.tr("There are unsaved changes. Do you want to save before closing the dialog?"),
@@ -118,8 +642,28 @@ class MainWindow(QDialog):
             super(MainWindow,  self).closeEvent(event)
 
     def __save(self):
-        self.saveSettings.emit(self.__settings)
-        self.__ui.saveButton.setEnabled(False)
+        self.__delegate.commitPending()
+        conflicts = [setting for setting in self.__dirty if setting in self.__conflicts]
+        if conflicts:
+            res = QMessageBox.question(self,  self.tr("Changed outside of the configurator"),
+                                       self.tr("These settings were changed in their ini file after you edited them:\n{0}\n"
+                                               "Do you want to overwrite them with your values?").format(
+                                           "\n".join("[{0}] {1}".format(setting.section,  setting.key) for setting in conflicts)),
+                                       QMessageBox.StandardButton.Save | QMessageBox.StandardButton.Cancel,
+                                       QMessageBox.StandardButton.Cancel)
+            if res != QMessageBox.StandardButton.Save:
+                return
+        changes = {}
+        for setting in self.__dirty:
+            changes.setdefault(self.__targetFile(setting),  []).append(setting)
+        self.saveSettings.emit(changes)
+        # the receiver marks written values as saved in the overlay, settings whose file is missing or couldn't
+        # be written are still modified and stay unsaved
+        for setting in list(self.__dirty):
+            self.__updateDirty(setting)
+        self.__ui.saveButton.setEnabled(len(self.__dirty) > 0)
+        self.__ui.settingsTree.viewport().update()
+        self.historyChanged()
 
     def __advancedClicked(self):
         self.sender().setText(self.tr("Advanced") if self.sender().isChecked() else self.tr("Basic"))
@@ -128,237 +672,103 @@ class MainWindow(QDialog):
         if newIdx != -1:
             self.__ui.categorySelection.setCurrentIndex(newIdx)
 
-    def __valueChanged(self,  sender,  value):
-        section = str(self.__ui.categorySelection.currentText())
-        # this should be a qvariant according to documentation but in pyqt5 it's not?
-        if type(sender.property("key")) == QtCore.QVariant:
-            itemName = sender.property("key").toString()
-        else:
-            itemName = sender.property("key")
-        setting = self.__settings[section][str(itemName)]
-        setting["value"] = value
-        matches = self.__ui.settingsTree.findItems(itemName,  QtCore.Qt.MatchFlag.MatchExactly)
-        item = matches[0]
-        self.__updateIcon(item)
-
-    def __updateIcon(self,  item):
-        setting = self.__settings[self.__lastSelectedCategory][str(item.text(0))]
-        saved = setting.get("saved",  setting["default"])
-        if  saved != setting["value"]:
-            item.setIcon(0, QtGui.QIcon("pyCfg:not-synchronized.png"))
-            self.__ui.saveButton.setEnabled(True)
+    def __valueChanged(self,  section,  key):
+        self.__profiler.count("valueChanged")
+        wasDirty = len(self.__dirty) > 0
+        self.__updateDirty(self.__model.settingForKey(section,  key))
+        if wasDirty != (len(self.__dirty) > 0):
+            self.__ui.saveButton.setEnabled(len(self.__dirty) > 0)
+            self.historyChanged()
+
+    def __updateDirty(self,  setting):
+        if self.__overlay.isModified(setting):
+            self.__dirty.add(setting)
         else:
-            item.setIcon(0, QtGui.QIcon("pyCfg:empty.png"))
-
-    def __valueChangedIndex(self,  value):
-        # odd problem: can't connect to the slot with text-parameter
-        self.__valueChanged(self.sender(),  str(self.sender().itemText(value)))
-
-    def __sliderChanged(self,  value):
-        self.__valueChanged(self.sender(),  value)
+            self.__dirty.discard(setting)
+            self.__conflicts.discard(setting)
+
+    def settingsReloaded(self,  settings,  conflicts):
+        """updates the rows of settings whose saved values were changed in their ini file. conflicts are the
+settings among them with unsaved edits that differ from the new saved value"""
+        self.__conflicts.update(conflicts)
+        for setting in settings:
+            self.__updateDirty(setting)
+            self.__model.refreshKey(setting.section,  setting.key)
+        self.__updateLayerSelection()
+        self.__ui.saveButton.setEnabled(len(self.__dirty) > 0)
+        self.historyChanged()
 
     def __updateCategories(self):
         self.__ui.categorySelection.clear()
         self.__ui.categorySelection.addItem("")
         advanced = self.__ui.advancedButton.isChecked()
-        for cat in list(self.__settings.keys()):
+        for cat in self.__settings.keys():
             display = advanced
             if not display:
-                for setting in list(self.__settings[cat].values()):
-                    if "basic" in setting.get("flags",  []):
+                for setting in self.__settings[cat].values():
+                    if "basic" in setting.flags:
                         display = True
                         continue
 
             if display:
                 self.__ui.categorySelection.addItem(cat)
 
-    def __rgbClicked(self):
-        col = QColorDialog.getColor(self.sender().palette().color(QPalette.ColorRole.ButtonText))
-        palette = self.sender().palette()
-        palette.setColor(QPalette.ColorRole.ButtonText,  col)
-        colStr = str(col.red()) + "," + str(col.green()) + "," + str(col.blue())
-        self.__valueChanged(self.sender(),  colStr) # xxx
-        self.sender().setPalette(palette)
-
-    def __boolClicked(self):
-        if self.sender().isChecked():
-            self.sender().setText(self.tr("true"))
-            self.__valueChanged(self.sender(),  True)
-            self.sender().setIcon(QtGui.QIcon("pyCfg:true.png"))
-        else:
-            self.sender().setText(self.tr("false"))
-            self.__valueChanged(self.sender(),  False)
-            self.sender().setIcon(QtGui.QIcon("pyCfg:false.png"))
-
-    # qt5
-    def __editBoxChanged(self):
-        self.__valueChanged(self.sender(),  str(self.sender().text()))
-
-    def __floatBoxChanged(self,  value):
-        self.__valueChanged(self.sender(),  value)
-
-    def __genSelectionEntry(self,  key,  setting):
-        newItem = QTreeWidgetItem(self.__ui.settingsTree,  [key])
-        selectionWidget = QComboBox(self.__ui.settingsTree)
-        selectionWidget.setProperty("key",  key)
-        for val in setting["values"]:
-            selectionWidget.addItem(str(val),  val)
-            if setting["value"] == val:
-                selectionWidget.setCurrentIndex(selectionWidget.count() - 1)
-
-        self.__ui.settingsTree.setItemWidget(newItem,  1,  selectionWidget)
-        selectionWidget.currentIndexChanged[int].connect(self.__valueChangedIndex)
-        return newItem
-
-    def __genBooleanEntry(self,  key,  setting):
-        newItem = QTreeWidgetItem(self.__ui.settingsTree, [key])
-        enableBtn = QPushButton(self.tr("true") if setting["value"] else self.tr("false"),  self.__ui.settingsTree)
-        enableBtn.setProperty("key",  key)
-        enableBtn.setCheckable(True)
-        enableBtn.setChecked(setting["value"])
-        enableBtn.setIcon(QtGui.QIcon("pyCfg:true.png") if setting["value"] else QtGui.QIcon("pyCfg:false.png"))
-        self.__ui.settingsTree.setItemWidget(newItem,  1, enableBtn)
-        enableBtn.clicked.connect(self.__boolClicked)
-        return newItem
-
-    def __genDoubleEditEntry(self,  key,  setting):
-        newItem = QTreeWidgetItem(self.__ui.settingsTree, [key, ""])
-        editWidget = QDoubleSpinBox(self.__ui.settingsTree)
-        if "range" in setting:
-            editWidget.setRange(setting["range"]["lower"],  setting["range"]["upper"])
-        else:
-            editWidget.setRange(-sys.float_info.max,  sys.float_info.max)
-        editWidget.setSingleStep(setting.get("step",  1.0))
-        editWidget.setProperty("key",  key)
-        editWidget.setValue(setting["value"])
-        editWidget.valueChanged[float].connect(self.__floatBoxChanged)
-        self.__ui.settingsTree.setItemWidget(newItem,  1,   editWidget)
-        return newItem
-
-    def __genSlider(self,  range,  step,  key,  value):
-            newWidget = QWidget(self.__ui.settingsTree)
-            layout = QHBoxLayout(newWidget)
-            layout.setStretch(2,  1)
-            slider = QSlider(Qt.Orientation.Horizontal,  newWidget)
-            spin = QSpinBox(self.__ui.settingsTree)
-            slider.setProperty("key",  key)
-            slider.setRange(range["lower"],  range["upper"])
-            spin.setRange(range["lower"],  range["upper"])
-            slider.setSingleStep(step)
-            spin.setSingleStep(step)
-            slider.setValue(value)
-            spin.setValue(value)
-            layout.addWidget(slider)
-            layout.addWidget(spin)
-            slider.sliderMoved.connect(spin.setValue)
-            slider.valueChanged.connect(spin.setValue)
-            spin.valueChanged.connect(slider.setValue)
-            newWidget.setLayout(layout)
-            slider.valueChanged.connect(self.__sliderChanged)
-            return newWidget
-
-    def __genIntEditEntry(self,  key,  setting):
-        newItem = QTreeWidgetItem(self.__ui.settingsTree, [key, ""])
-        if "range" in setting:
-            newWidget = self.__genSlider(setting["range"],  setting.get("step",  1),  str(key),  setting["value"])
-        else:
-            newWidget = QSpinBox(self.__ui.settingsTree)
-            newWidget.setRange(-2147483648,  2147483647)
-            newWidget.setSingleStep(setting.get("step",  1))
-            newWidget.setProperty("key",  key)
-            newWidget.setValue(setting["value"])
-            newWidget.valueChanged.connect(self.__sliderChanged)
-        self.__ui.settingsTree.setItemWidget(newItem,  1,   newWidget)
-        return newItem
-
-    def __genUnsignedEditEntry(self,  key,  setting):
-        newItem = QTreeWidgetItem(self.__ui.settingsTree, [key, ""])
-        if "range" in setting:
-            newWidget = self.__genSlider(setting["range"],  setting.get("step",  1),  key,  setting["value"])
-        else:
-            newWidget = QSpinBox(self.__ui.settingsTree)
-            newWidget.setRange(0,   sys.maxsize)
-            newWidget.setSingleStep(setting.get("step",  1))
-            newWidget.setProperty("key",  key)
-            newWidget.setValue(setting["value"])
-            newWidget.valueChanged.connect(self.__sliderChanged)
-        self.__ui.settingsTree.setItemWidget(newItem,  1,   newWidget)
-        return newItem
-
-    def __genEditEntry(self,  key,  setting):
-        newItem = QTreeWidgetItem(self.__ui.settingsTree, [key])
-        editBox = QLineEdit(str(setting["value"]),  self.__ui.settingsTree)
-        editBox.setProperty("key",  key)
-        # connecting to textEdited crashes with PyQt4 for unknown reason, editingFinished does not
-        editBox.editingFinished.connect(self.__editBoxChanged)
-        # editBox.textEdited.connect(self.__editBoxChanged)
-        self.__ui.settingsTree.setItemWidget(newItem,  1,   editBox)
-
-        return newItem
-
-    def __genColorEntry(self,  key,  setting):
-        newItem = QTreeWidgetItem(self.__ui.settingsTree, [key])
-        colorBtn = QPushButton(self.tr("Color"),  self.__ui.settingsTree)
-        if setting["value"] == "":
-            rgb = [0,  0,  0]
-        else:
-            rgb = [int(col) for col in str(setting["value"]).split(",")]
-        color = QColor(rgb[0],  rgb[1],  rgb[2])
-        palette = colorBtn.palette()
-        palette.setColor(QPalette.ColorRole.ButtonText,  color)
-        colorBtn.setPalette(palette)
-        font = colorBtn.font()
-        font.setBold(True)
-        colorBtn.setFont(font)
-        colorBtn.setProperty("key",  key)
-        colorBtn.clicked.connect(self.__rgbClicked)
-        self.__ui.settingsTree.setItemWidget(newItem,  1,   colorBtn)
-        return newItem
-
-    def __addSetting(self,  key,  setting):
-        if "values" in setting:
-            return self.__genSelectionEntry(key,  setting)
-        else:
-            keyType = key[0]
-            if keyType == 'b':
-                return self.__genBooleanEntry(key,  setting)
-            elif keyType == 'f':
-                return self.__genDoubleEditEntry(key,  setting)
-            elif keyType == 'i':
-                return self.__genIntEditEntry(key,  setting)
-            elif keyType == 'u':
-                return self.__genUnsignedEditEntry(key,  setting)
-            elif keyType == 'r':
-                return self.__genColorEntry(key,  setting)
-            else:
-                return self.__genEditEntry(key,  setting)
-
     def __updateTree(self):
-        self.__ui.settingsTree.clear()
+        # the open editor is removed with the rows without being committed
+        self.__delegate.commitPending()
+        query = str(self.__ui.searchEdit.text()).strip()
+        if query and self.__searchIndex is not None:
+            with self.__profiler.phase("updateTree",  search=query) as phase:
+                advanced = self.__ui.advancedButton.isChecked()
+                rows = [setting for setting in self.__searchIndex.search(query)
+                        if "hidden" not in setting.flags and (advanced or "basic" in setting.flags)]
+                self.__model.setRows("",  rows,  True)
+                self.__ui.settingsTree.resizeColumnToContents(0)
+                phase.set(rows=len(rows))
+            return
+
         if not str(self.__ui.categorySelection.currentText()) in self.__settings:
+            self.__model.setRows("",  [])
             return
         category = str(self.__ui.categorySelection.currentText())
         self.__lastSelectedCategory = category
 
-        for settingKey in sorted(list(self.__settings[category].keys()), key=lambda setKey: setKey[1:]):
-            setting = self.__settings[category][settingKey]
-            if "hidden" in setting.get("flags", []):
+        with self.__profiler.phase("updateTree",  category=category) as phase:
+            advanced = self.__ui.advancedButton.isChecked()
+            cacheKey = (category.lower(),  advanced)
+            rows = self.__categoryCache.get(cacheKey)
+            cached = rows is not None
+            if rows is None:
+                rows = self.__categoryRows(category,  advanced)
+                if self.__categoryCacheSize > 0:
+                    self.__categoryCache[cacheKey] = rows
+                    if len(self.__categoryCache) > self.__categoryCacheSize:
+                        self.__categoryCache.popitem(last=False)
+            else:
+                self.__categoryCache.move_to_end(cacheKey)
+            self.__model.setRows(category,  rows)
+
+            self.__ui.settingsTree.resizeColumnToContents(0)
+            if self.__profiler.enabled:
+                # rows are painted by the delegate, the only widgets are the editors currently open
+                phase.set(rows=len(rows),  cached=cached,  widgets=len(self.__ui.settingsTree.viewport().findChildren(QWidget)))
+
+    def __categoryRows(self,  category,  advanced):
+        rows = []
+        for setting in sorted(self.__settings[category].values(), key=lambda setting: setting.key[1:]):
+            if "hidden" in setting.flags:
                 continue
-            if not self.__ui.advancedButton.isChecked() and "basic" not in setting.get("flags", []):
+            if not advanced and "basic" not in setting.flags:
                 continue
-            newItem = self.__addSetting(settingKey,  setting)
-            self.__updateIcon(newItem)
-            if "description" in setting:
-                newItem.setToolTip(0, str(self.tr(setting["description"])))
-            if "default" in setting:
-                newItem.setToolTip(1, self.tr("Default: ") + str(setting["default"]))
-            self.__ui.settingsTree.addTopLevelItem(newItem)
-
-        self.__ui.settingsTree.resizeColumnToContents(0)
+            rows.append(setting)
+        return rows
 
     def __sectionChanged(self,  sectionIdx):
         self.__updateTree()
 
+    def __searchChanged(self,  text):
+        self.__updateTree()
+
 
 class IniEdit(mobase.IPluginTool):
 
@@ -366,19 +776,38 @@ class IniEdit(mobase.IPluginTool):
         super(IniEdit, self).__init__()
         self.__organizer = None
         self.__window = None
-        self.__settings = None
+        self.__overlay = None
+        self.__database = None
         self.__parentWidget = None
+        self.__profiler = Profiler()
+        self.__watcher = None
+        self.__history = None
+        # values of the ini files of the dialog currently open, None while they are loaded
+        self.__layers = None
+        self.__changedWhileLoading = set()
 
     def init(self, organizer):
         self.__organizer = organizer
         self.__window = None
-        try:
-            f = open(organizer.pluginDataPath() + "/settings.json", "r")
-        except IOError:
+        jsonPath = organizer.pluginDataPath() + "/settings.json"
+        if not os.path.isfile(jsonPath):
             return False
         QtCore.QDir.addSearchPath("pyCfg", self.__organizer.pluginDataPath() + "/res/")
-        self.__settings = json.loads(f.read())
-        f.close()
+        self.__profiler = createProfiler(self.__organizer.pluginSetting(self.name(), "profile"),
+                                         self.__organizer.pluginSetting(self.name(), "profile_trace"),
+                                         lambda line: QtCore.qDebug(line.encode('ascii','ignore')))
+        try:
+            registry = GameRegistry.load(organizer.pluginDataPath() + "/games.json")
+        except (IOError, ValueError):
+            return False
+        self.__database = SettingsDatabase(jsonPath, organizer.pluginDataPath() + "/pyCfg_settings.cache",
+                                           registry)
+        if not self.__organizer.pluginSetting(self.name(), "lazy_load"):
+            try:
+                with self.__profiler.phase("init.load"):
+                    self.__database.load([self.__organizer.managedGame().gameShortName()])
+            except (IOError, ValueError):
+                return False
         return True
 
     def name(self):
@@ -394,7 +823,14 @@ class IniEdit(mobase.IPluginTool):
         return mobase.VersionInfo(1, 3, 0, 0)
 
     def settings(self):
-        return []
+        return [
+            mobase.PluginSetting("lazy_load", self.tr("Defer loading the settings database until the tool is first opened"), False),
+            mobase.PluginSetting("category_cache_size", self.tr("Number of categories kept ready for display when switching between them"), 8),
+            mobase.PluginSetting("profile", self.tr("Log how long loading, displaying and saving settings takes"), False),
+            mobase.PluginSetting("profile_trace", self.tr("File to write a chrome trace of the profiled phases to"), ""),
+            mobase.PluginSetting("history_entries", self.tr("Number of saves that can be undone, 0 disables the history"), 50),
+            mobase.PluginSetting("history_size", self.tr("Maximum size of the history of saves in KiB, 0 for no limit"), 512),
+        ]
 
     def enabledByDefault(self):
         return False
@@ -415,152 +851,245 @@ class IniEdit(mobase.IPluginTool):
         return QCoreApplication.translate("IniEdit", str)
 
     def __iniFiles(self):
-        gameName = self.__organizer.managedGame().gameShortName().lower()
-        if gameName == "oblivion":
-            return ["oblivion.ini",  "oblivionprefs.ini"]
-        elif gameName == "fallout3" or gameName == "falloutnv":
-            return ["fallout.ini",  "falloutprefs.ini"]
-        elif gameName == "fallout4":
-            return ["fallout4.ini",  "fallout4prefs.ini", "fallout4custom.ini"]
-        elif gameName == "skyrim":
-            return ["skyrim.ini",  "skyrimprefs.ini"]
-        elif gameName == "skyrimse":
-            return ["skyrim.ini",  "skyrimprefs.ini"]
-        else:
-            return []
+        return self.__database.iniFiles(self.__organizer.managedGame().gameShortName())
 
     def __filteredSettings(self):
-        newSettings = CaselessDict()
-        gameName = str(self.__organizer.managedGame().gameShortName())
-
-        iniFiles = self.__iniFiles()
-
-        for sectionKey in list(self.__settings.keys()):
-            section = self.__settings[sectionKey]
-            filteredSection = CaselessDict()
-            for key,  setting in section.items():
-                setting["value"] = setting["default"]
-                if iniFiles:
-                    if "prefs" in setting.get("flags", []):
-                        setting["file"] = iniFiles[1]
-                    else:
-                        setting["file"] = iniFiles[0]
-                if "games" in setting and gameName not in setting["games"]:
-                    # not for this game
-                    continue
-                filteredSection[str(key)] = setting
-            if len(filteredSection) > 0:
-                newSettings[sectionKey] = filteredSection
-        return newSettings
-
-    def updateSettings(self, settings, fileName):
-        parser = configparser.ConfigParser(allow_no_value=True)
-        parser.optionxform = str
+        # the sections are shared between sessions, values are kept in a SettingsOverlay instead
+        with self.__profiler.phase("filteredSettings"):
+            return self.__database.gameSections(str(self.__organizer.managedGame().gameShortName()))
 
+    def __basePath(self):
         profile = self.__organizer.profile()
         if profile.localSettingsEnabled():
-            base_path = profile.absolutePath()
+            return profile.absolutePath()
         else:
-            base_path = self.__organizer.managedGame().documentsDirectory().absolutePath()
+            return self.__organizer.managedGame().documentsDirectory().absolutePath()
+
+    def __createHistory(self):
+        """returns the history of saves of the current profile, None if it's disabled"""
+        entries = self.__organizer.pluginSetting(self.name(), "history_entries")
+        size = self.__organizer.pluginSetting(self.name(), "history_size")
+        entries = 50 if entries is None else int(entries)
+        if entries <= 0:
+            return None
+        return SettingsHistory(self.__organizer.profile().absolutePath() + "/" + HISTORY_DIRECTORY, entries,
+                               (512 if size is None else int(size)) * 1024)
+
+    def updateSettings(self, settings, overlay, fileName, records=None, layers=None):
+        """applies the values of an ini file to the settings in overlay. records are the parsed contents of
+the file, it is read if they aren't passed. If layers is passed, the values replace the layer of the file
+and overlay gets the resulting effective values. Returns the list of problems found in the file"""
+        if records is None:
+            records = SettingsLoader.readIniFile(self.__basePath() + "/" + fileName)
+        if layers is not None:
+            return self.__updateLayer(settings, overlay, layers, fileName, records)[0]
+        if records is None:
+            return []
+        with self.__profiler.phase("updateSettings", file=fileName) as phase:
+            issues = applyIniRecords(settings, overlay, fileName, records, self.__overridesAll(fileName))
+            phase.set(records=len(records), issues=len(issues))
+        self.__logIssues(fileName, issues)
+        return issues
+
+    def __overridesAll(self, fileName):
+        # custom ini files exist to override settings of the other files
+        return self.__database.registry().role(self.__organizer.managedGame().gameShortName(), fileName) == CUSTOM
+
+    def __updateLayer(self, settings, overlay, layers, fileName, records):
+        """replaces the layer of an ini file with its records, None if it doesn't exist, and updates the
+settings whose effective value changed. Returns the problems found in the file, the changed settings and
+those among them whose unsaved edits conflict with the new value"""
+        with self.__profiler.phase("updateSettings", file=fileName) as phase:
+            issues, values = ([], {}) if records is None else \
+                iniFileValues(settings, fileName, records, self.__overridesAll(fileName))
+            changed = layers.setLayer(fileName, values, records is not None)
+            conflicts = []
+            for setting in changed:
+                saved = layers.value(setting)
+                modified = overlay.isModified(setting)
+                overlay.setSaved(setting, saved)
+                if not modified:
+                    overlay.setValue(setting, saved)
+                elif overlay.value(setting) != saved:
+                    conflicts.append(setting)
+            phase.set(records=0 if records is None else len(records), issues=len(issues), changed=len(changed))
+        self.__logIssues(fileName, issues)
+        return issues, changed, conflicts
+
+    def __logIssues(self, fileName, issues):
+        unexpectedSections = set()
+        for issue in issues:
+            if issue.problem == UNEXPECTED_SECTION:
+                if issue.section.lower() not in unexpectedSections:
+                    unexpectedSections.add(issue.section.lower())
+                    QtCore.qDebug(self.tr("unexpected section {0} in {1}").format(issue.section, fileName).encode('ascii','ignore'))
+            elif issue.problem == UNKNOWN_SETTING:
+                QtCore.qDebug(self.tr("unknown ini setting {0}").format(issue.key).encode('ascii','ignore'))
+            elif issue.problem == WRONG_FILE:
+                QtCore.qDebug(self.tr("{0} in wrong ini file ({1}, should be {2})").format(
+                    issue.key, fileName, issue.expected).encode('ascii','ignore'))
+            else:
+                QtCore.qDebug(describeIssue(issue).encode('ascii','ignore'))
 
-        filePath = base_path + "/" + fileName
-        if not os.path.exists(filePath):
+    def __reportIssues(self,  issues):
+        """shows all invalid values found while loading in one message box"""
+        errors = [issue for issue in issues if issue.problem in ERRORS]
+        if not errors:
             return
-        parser.read(filePath)
-        for section in parser.sections():
-            if section not in settings:
-                QtCore.qDebug(self.tr("unexpected section {0} in {1}").format(section, fileName).encode('ascii','ignore'))
-                continue
-            else:
-                settings.updateKey(section)
-
-            for setting in parser.items(section, True):
-                # test if the setting is allowed in this file
-                if setting[0].lower() not in settings[section]:
-                    QtCore.qDebug(self.tr("unknown ini setting {0}").format(setting[0]).encode('ascii','ignore'))
-                    continue
-
-                if "both" not in settings[section][setting[0]].get("flags", [])\
-                        and fileName.lower() != settings[section][setting[0]]["file"].lower():
-                    QtCore.qDebug(self.tr("{0} in wrong ini file ({1}, should be {2})").format(
-                        setting[0], fileName, settings[section][setting[0]]["file"]).encode('ascii','ignore'))
-                    continue
-
-                newData = settings[section].get(setting[0],  {})
-                value = setting[1].split('//')[0].strip()
-                try:
-                    if setting[0][0] == 'b':
-                        value = True if value == "1" else False
-                    elif setting[0][0] == 'i' or setting[0][0] == 'u':
-                        value = int(value)
-                    elif setting[0][0] == 'f':
-                        try:
-                            value = float(value)
-                        except ValueError:
-                            value = float(int(value))
-                except ValueError as e:
-                    QMessageBox.warning(self.__window,  self.tr("Invalid configuration file"),
-                                    self.tr("Your configuration files contains an invalid value: {0}={1} (in section {2}).\n").format(setting[0], setting[1], section)
-                                    + self.tr("Please note that the game probably won't report an error, it will just ignore this setting.\n")
-                                    + self.tr("Please note that even if someone told you to use this setting, that doesn't mean they know what they're talking about.\n")
-                                    + self.tr("BUT, if you know for a fact this is a valid setting, then please contact me at sherb@gmx.net."))
-                newData["value"] = value
-                newData["saved"] = value
-                if "file" not in newData:
-                    newData["file"] = fileName
-                if "default" not in newData:
-                    newData["default"] = value
-                settings[section][str(setting[0])] = newData
-
-    def __save(self,  settings):
+        box = QMessageBox(QMessageBox.Icon.Warning,  self.tr("Invalid configuration file"),
+                          self.tr("Your configuration files contain {0} invalid value(s), see the details for a list of all problems found.\n").format(len(errors))
+                          + self.tr("Please note that the game probably won't report an error, it will just ignore this setting.\n")
+                          + self.tr("Please note that even if someone told you to use this setting, that doesn't mean they know what they're talking about.\n"),
+                          QMessageBox.StandardButton.Ok,  self.__window)
+        box.setDetailedText("\n".join(describeIssue(issue) for issue in issues))
+        box.exec()
+
+    def __save(self,  changes):
+        """writes changed settings. changes maps each ini file name to a list of settings whose value in the
+overlay of the open dialog differs from the saved one, files without changes are not touched"""
+        basePath = self.__basePath()
         try:
-            ini_files = {}
-
-            profile = self.__organizer.profile()
-            if profile.localSettingsEnabled():
-                base_path = profile.absolutePath()
-            else:
-                base_path = self.__organizer.managedGame().documentsDirectory().absolutePath()
-
-            for fileName in self.__iniFiles():
-                filePath = base_path + "/" + fileName
-                if os.path.exists(filePath):
-                    parser = configparser.ConfigParser(allow_no_value=True)
-                    parser.optionxform = str
-                    parser.read(filePath)
-                    ini_files[fileName] = parser
-            count = 0
-            for sectionkey, section in settings.items():
-                count += 1
-                for settingkey, setting in section.items():
-                    if setting["value"] != setting.get("saved",  setting["default"]):
-                        try:
-                            ini_files[setting["file"]].add_section(sectionkey)
-                        except configparser.DuplicateSectionError:
-                            pass
-
-                        if type(setting["value"]) == bool:
-                            ini_files[setting["file"]].set(sectionkey,  settingkey,  '1' if setting["value"] else '0')
-                        else:
-                            ini_files[setting["file"]].set(sectionkey,  settingkey,  str(setting["value"]))
-                        setting["saved"] = setting["value"]
-            for fileName, data in ini_files.items():
-                filePath = base_path + "/" + fileName
-                if os.path.exists(filePath):
-                    out = open(filePath, 'w')
-                    data.write(out)
-                    out.close()
+            with self.__profiler.phase("save",  files=len(changes),  settings=sum(len(settings) for settings in changes.values())):
+                missing = writeSettings(basePath,  changes,  self.__overlay,  self.__history)
         except Exception as e:
             print(e)
+            return
+        for fileName in missing:
+            QtCore.qDebug("not saving settings to missing file {0}".format(fileName).encode('ascii','ignore'))
+        if missing and self.__window is not None:
+            QMessageBox.warning(self.__window,  self.tr("Settings not saved"),
+                                self.tr("These ini files don't exist, the settings changed in them were not saved:\n{0}").format(
+                                    "\n".join(missing)))
+        shadowed = []
+        for fileName, settings in changes.items():
+            if fileName in missing:
+                continue
+            # our own changes must not be reported as outside changes by the watcher
+            if self.__watcher is not None:
+                self.__watcher.acknowledge(basePath + "/" + fileName)
+            if self.__layers is None:
+                continue
+            for setting in settings:
+                self.__layers.setValue(fileName,  setting,  self.__overlay.value(setting))
+                saved = self.__layers.value(setting)
+                self.__overlay.setSaved(setting,  saved)
+                if self.__overlay.value(setting) != saved:
+                    # a file later in the load order overrides the one the value was saved to
+                    self.__overlay.setValue(setting,  saved)
+                    shadowed.append((setting,  fileName))
+        if shadowed and self.__window is not None:
+            self.__window.settingsReloaded([setting for setting, fileName in shadowed],  [])
+            QMessageBox.information(self.__window,  self.tr("Overridden settings"),
+                                    self.tr("These settings were saved but have no effect since a file later in the load order sets them too:\n{0}").format(
+                                        "\n".join("[{0}] {1} ({2}, overridden by {3})".format(
+                                            setting.section,  setting.key,  fileName,  self.__layers.source(setting))
+                                            for setting, fileName in shadowed)))
+
+    def __iniFileChanged(self,  path):
+        """re-reads an ini file that was modified outside of the configurator and updates the settings whose
+value in it changed. Unsaved edits are kept and reported as conflicts"""
+        if self.__window is None:
+            return
+        if self.__layers is None:
+            # still loading, the file is read again once the initial values are known
+            self.__changedWhileLoading.add(path)
+            return
+        changed, conflicts = self.__reload(path)
+        QtCore.qDebug("{0} changed outside of the configurator, {1} setting(s) reloaded, {2} conflict(s)".format(
+            os.path.basename(path),  len(changed),  len(conflicts)).encode('ascii','ignore'))
+
+    def __reload(self,  path):
+        fileName = os.path.basename(path)
+        with self.__profiler.phase("reload",  file=fileName):
+            issues, changed, conflicts = self.__updateLayer(self.__filteredSettings(),  self.__overlay,  self.__layers,
+                                                            fileName,  SettingsLoader.readIniFile(path))
+        self.__window.settingsReloaded(changed,  conflicts)
+        return changed, conflicts
+
+    def __undo(self):
+        self.__moveHistory(self.tr("Undo failed"),  lambda basePath: self.__history.undo(basePath))
+
+    def __redo(self):
+        self.__moveHistory(self.tr("Redo failed"),  lambda basePath: self.__history.redo(basePath))
+
+    def __restore(self,  timestamp):
+        self.__moveHistory(self.tr("Restore failed"),  lambda basePath: self.__history.restore(basePath,  timestamp))
+
+    def __moveHistory(self,  title,  move):
+        """writes the keys changed by the saves move undoes or redoes and updates the settings from the
+files it touched"""
+        if self.__history is None or self.__layers is None:
+            return
+        basePath = self.__basePath()
+        try:
+            with self.__profiler.phase("history") as phase:
+                changes = move(basePath)
+                phase.set(keys=len(changes))
+        except Exception as e:
+            QMessageBox.warning(self.__window,  title,  str(e))
+            return
+        for fileName in sorted(set(change.file for change in changes)):
+            if self.__watcher is not None:
+                self.__watcher.acknowledge(basePath + "/" + fileName)
+            self.__reload(basePath + "/" + fileName)
+        QtCore.qDebug("{0} key(s) restored from the history".format(len(changes)).encode('ascii','ignore'))
+        self.__window.historyChanged()
+
+    def __settingsLoaded(self,  settings,  overlay,  layers,  iniFiles,  contents,  startTime):
+        issues = []
+        for iniFile, records in zip(iniFiles, contents):
+            issues.extend(self.__updateLayer(settings, overlay, layers, iniFile, records)[0])
+        if self.__window is not None:
+            self.__layers = layers
+            self.__window.setLoading(False)
+            for path in sorted(self.__changedWhileLoading):
+                self.__iniFileChanged(path)
+            self.__changedWhileLoading.clear()
+            self.__reportIssues(issues)
+        QtCore.qDebug("configurator settings loaded after {0:.1f} ms".format((time.perf_counter() - startTime) * 1000.0).encode('ascii','ignore'))
 
     def display(self):
+        startTime = time.perf_counter()
         settings = self.__filteredSettings()
-        for iniFile in self.__iniFiles():
-            self.updateSettings(settings, iniFile)
-
-        self.__window = MainWindow(settings)
+        iniFiles = self.__iniFiles()
+        basePath = self.__basePath()
+
+        cacheSize = self.__organizer.pluginSetting(self.name(), "category_cache_size")
+        self.__overlay = SettingsOverlay()
+        # the ini files are layers overriding each other in the order of iniFiles
+        layers = LayeredValues(iniFiles)
+        self.__history = self.__createHistory()
+        self.__window = MainWindow(settings,  self.__overlay,  categoryCacheSize=8 if cacheSize is None else int(cacheSize),
+                                   searchIndex=self.__database.searchIndex(str(self.__organizer.managedGame().gameShortName())),
+                                   profiler=self.__profiler,  layers=layers,  history=self.__history)
         self.__window.saveSettings.connect(self.__save)
+        self.__window.undoRequested.connect(self.__undo)
+        self.__window.redoRequested.connect(self.__redo)
+        self.__window.restoreRequested.connect(self.__restore)
+        self.__window.firstPainted.connect(lambda: QtCore.qDebug("configurator first paint after {0:.1f} ms".format(
+            (time.perf_counter() - startTime) * 1000.0).encode('ascii','ignore')))
+        self.__window.setLoading(True)
+
+        # ini files changed by the game or other tools while the dialog is open are read again
+        self.__layers = None
+        self.__changedWhileLoading = set()
+        self.__watcher = IniFileWatcher([basePath + "/" + iniFile for iniFile in iniFiles],  self.__window)
+        self.__watcher.fileChanged.connect(self.__iniFileChanged)
+
+        # the dialog is shown right away, the ini files are read in the background
+        loader = SettingsLoader([basePath + "/" + iniFile for iniFile in iniFiles])
+        overlay = self.__overlay
+        loader.loaded.connect(lambda contents: self.__settingsLoaded(settings,  overlay,  layers,  iniFiles,  contents,  startTime),
+                              Qt.ConnectionType.QueuedConnection)
+        loader.start()
         self.__window.exec()
+        loader.wait()
+        self.__profiler.flush()
+        self.__watcher = None
+        self.__history = None
+        self.__layers = None
+        self.__window = None
+        self.__overlay = None
 
 def createPlugin():
         return IniEdit()
@@ -0,0 +1,232 @@
+"""Applies a preset of settings to the ini files of many profiles or checks those ini files, without
+starting Mod Organizer.
+
+usage: python pyCfgBatch.py --game skyrim apply preset.ini profile1 profile2 ...
+       python pyCfgBatch.py --game skyrim lint [--json] profile1 profile2 ...
+       python pyCfgBatch.py --game skyrim undo profile1 profile2 ...
+
+The preset is either an ini file or a json file mapping sections to dicts of key -> value. It is validated
+against settings.json before anything is written. Profiles are processed in parallel and the changes made
+to each of them are reported. The changes are recorded in the history of each profile, so they can be
+reverted with undo or from the configurator.
+
+lint reports every problem found in the ini files of the profiles: unknown sections and settings, settings
+in the wrong file, duplicates, invalid and out of range values. The exit code is 1 if any value is invalid."""
+
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from pyCfgDatabase import SettingsDatabase, SettingsOverlay, GameRegistry, LayeredValues, CUSTOM, iniFileValues,\
+    formatValue, writeSettings
+from pyCfgIni import IniRecord, convertValue, parseIniFile
+from pyCfgLint import ERRORS, validateIniRecords, describeIssue, issueToJson
+from pyCfgHistory import HISTORY_DIRECTORY, SettingsHistory
+
+
+def defaultCachePath():
+    """returns the path of the settings cache in the cache directory of the current user"""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pyCfg", "settings.cache")
+
+
+def readPreset(path):
+    """returns the entries of a preset file as IniRecord tuples"""
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        records = []
+        for section, values in data.items():
+            for key, value in values.items():
+                records.append(IniRecord(section, key, value, json.dumps(value), 0, True))
+        return records
+    return list(parseIniFile(path))
+
+
+def _checkType(setting, value):
+    if setting.type == 'b':
+        return isinstance(value, bool) or value in (0, 1)
+    elif setting.type == 'f':
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif setting.type == 'i' or setting.type == 'u':
+        return isinstance(value, int) and not isinstance(value, bool) and (setting.type == 'i' or value >= 0)
+    return isinstance(value, str)
+
+
+def validatePreset(settings, records):
+    """checks the preset records against the settings of the game. Returns a list of (setting, value) to
+apply and a list of error messages"""
+    entries = []
+    errors = []
+    for record in records:
+        where = "[{0}] {1}".format(record.section, record.key)
+        section = settings.get(record.section)
+        setting = None if section is None else section.get(record.key)
+        if setting is None:
+            errors.append("{0}: not a setting of this game".format(where))
+            continue
+        if setting.file is None:
+            errors.append("{0}: the game has no ini file for this setting".format(where))
+            continue
+        value = record.value
+        if isinstance(value, str) and setting.type != 's' and setting.type != 'r':
+            try:
+                value = convertValue(setting.key, record.text)
+            except ValueError:
+                errors.append("{0}: invalid value {1}".format(where, record.text))
+                continue
+        if not _checkType(setting, value):
+            errors.append("{0}: invalid value {1}".format(where, record.text))
+            continue
+        if setting.type == 'b':
+            value = bool(value)
+        if setting.range is not None and not setting.range[0] <= value <= setting.range[1]:
+            errors.append("{0}: {1} is out of range ({2} - {3})".format(where, record.text, setting.range[0],
+                                                                       setting.range[1]))
+            continue
+        if setting.values is not None and value not in setting.values:
+            errors.append("{0}: {1} is not one of {2}".format(where, record.text,
+                                                             ", ".join(str(val) for val in setting.values)))
+            continue
+        entries.append((setting, value))
+    return entries, errors
+
+
+def applyPreset(settings, iniFiles, profilePath, entries, dryRun=False, overrideFiles=(), history=None):
+    """applies the validated preset entries to the ini files in profilePath. Each value is written to the
+file its current value comes from, or the file of the setting if it isn't set anywhere. overrideFiles are
+the files that may set any setting, the keys written are recorded in history if it is passed. Returns the
+changes as a list of (file, section, key, old value, new value) and the names of files that were skipped
+because they don't exist"""
+    layers = LayeredValues(iniFiles)
+    for iniFile in iniFiles:
+        filePath = profilePath + "/" + iniFile
+        if os.path.exists(filePath):
+            layers.setLayer(iniFile, iniFileValues(settings, iniFile, parseIniFile(filePath),
+                                                   iniFile in overrideFiles)[1])
+
+    overlay = SettingsOverlay()
+    diff = []
+    changes = {}
+    for setting, value in entries:
+        old = layers.value(setting)
+        if old == value:
+            continue
+        overlay.setValue(setting, value)
+        fileName = layers.source(setting) or setting.file
+        changes.setdefault(fileName, []).append(setting)
+        diff.append((fileName, setting.section, setting.key, old, value))
+
+    missing = [fileName for fileName in changes if not os.path.exists(profilePath + "/" + fileName)]
+    if not dryRun:
+        missing = writeSettings(profilePath, changes, overlay, history)
+    return diff, missing
+
+
+def lintProfile(settings, iniFiles, profilePath, overrideFiles=()):
+    """returns the problems found in the ini files in profilePath"""
+    issues = []
+    for iniFile in iniFiles:
+        filePath = profilePath + "/" + iniFile
+        if os.path.exists(filePath):
+            issues.extend(validateIniRecords(settings, iniFile, parseIniFile(filePath), iniFile in overrideFiles)[0])
+    return issues
+
+
+def _apply(args, settings, iniFiles, overrideFiles):
+    entries, errors = validatePreset(settings, readPreset(args.preset))
+    if errors:
+        for error in errors:
+            print("{0}: {1}".format(args.preset, error), file=sys.stderr)
+        return 2
+
+    with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as pool:
+        results = pool.map(lambda profile: applyPreset(
+            settings, iniFiles, profile, entries, args.dry_run, overrideFiles,
+            None if args.no_history else SettingsHistory(os.path.join(profile, HISTORY_DIRECTORY))), args.profiles)
+        for profile, (diff, missing) in zip(args.profiles, results):
+            print("{0}: {1} change(s)".format(profile, len(diff)))
+            for fileName, section, key, old, new in diff:
+                print("  {0} [{1}] {2}: {3} -> {4}".format(fileName, section, key, formatValue(old), formatValue(new)))
+            for fileName in missing:
+                print("  {0} doesn't exist, not written".format(fileName))
+    return 0
+
+
+def _undo(args):
+    for profile in args.profiles:
+        changes = SettingsHistory(os.path.join(profile, HISTORY_DIRECTORY)).undo(profile)
+        print("{0}: {1} key(s) reverted".format(profile, len(changes)))
+        for change in changes:
+            print("  {0} [{1}] {2}: {3} -> {4}".format(change.file, change.section, change.key,
+                                                      "(missing)" if change.old is None else change.old,
+                                                      "(removed)" if change.new is None else change.new))
+    return 0
+
+
+def _lint(args, settings, iniFiles, overrideFiles):
+    with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as pool:
+        results = list(pool.map(lambda profile: lintProfile(settings, iniFiles, profile, overrideFiles),
+                                args.profiles))
+
+    failed = any(issue.problem in ERRORS for issues in results for issue in issues)
+    if args.json:
+        json.dump({profile: [issueToJson(issue) for issue in issues]
+                   for profile, issues in zip(args.profiles, results)}, sys.stdout, indent=2)
+        print()
+    else:
+        for profile, issues in zip(args.profiles, results):
+            print("{0}: {1} problem(s)".format(profile, len(issues)))
+            for issue in issues:
+                print("  " + describeIssue(issue))
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply a settings preset to the ini files of profiles or check them")
+    parser.add_argument("--settings", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings.json"),
+                        help="path of the settings database (default: settings.json next to this script)")
+    parser.add_argument("--games", help="path of the game registry (default: games.json next to the settings database)")
+    parser.add_argument("--cache", default=defaultCachePath(),
+                        help="file the indexed settings database is cached in, empty for no cache (default: in the "
+                             "cache directory of the user)")
+    parser.add_argument("--game", required=True, help="short name of the game, e.g. skyrim or fallout4")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="number of profiles processed in parallel")
+    commands = parser.add_subparsers(dest="command", required=True)
+    applyParser = commands.add_parser("apply", help="apply a preset")
+    applyParser.add_argument("--dry-run", action="store_true", help="only report the changes, don't write them")
+    applyParser.add_argument("--no-history", action="store_true", help="don't record the changes for undo")
+    applyParser.add_argument("preset", help="preset file, .ini or .json")
+    applyParser.add_argument("profiles", nargs="+", help="profile directories containing the ini files")
+    lintParser = commands.add_parser("lint", help="report problems in the ini files")
+    lintParser.add_argument("--json", action="store_true", help="print the problems as json")
+    lintParser.add_argument("profiles", nargs="+", help="profile directories containing the ini files")
+    undoParser = commands.add_parser("undo", help="revert the last change saved to the ini files")
+    undoParser.add_argument("profiles", nargs="+", help="profile directories containing the ini files")
+    args = parser.parse_args(argv)
+
+    dataPath = os.path.dirname(os.path.abspath(args.settings))
+    registry = GameRegistry.load(args.games or os.path.join(dataPath, "games.json"))
+    database = SettingsDatabase(args.settings, args.cache or None, registry)
+    database.load([args.game])
+    settings = database.gameSections(args.game)
+    iniFiles = database.iniFiles(args.game)
+    if not iniFiles:
+        print("unsupported game {0}".format(args.game), file=sys.stderr)
+        return 2
+
+    overrideFiles = [iniFile.name for iniFile in registry.iniFileEntries(args.game) if iniFile.role == CUSTOM]
+    if args.command == "undo":
+        return _undo(args)
+    if args.command == "lint":
+        return _lint(args, settings, iniFiles, overrideFiles)
+    return _apply(args, settings, iniFiles, overrideFiles)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,606 @@
+import os
+import re
+import sys
+import json
+import pickle
+import hashlib
+import logging
+import tempfile
+import collections
+
+from pyCfgIni import patchIniFile
+from pyCfgLint import validateIniRecords
+from pyCfgHistory import Change
+
+logger = logging.getLogger(__name__)
+
+# roles of the ini files of a game. Settings are written to the main file unless their flags contain the
+# name of another role
+MAIN = "main"
+PREFS = "prefs"
+CUSTOM = "custom"
+INI_ROLES = (MAIN, PREFS, CUSTOM)
+
+# an ini file of a game. Files with a higher priority override the values of files with a lower one
+IniFile = collections.namedtuple("IniFile", ["name", "role", "priority"])
+
+
+class GameRegistry(object):
+    """The supported games and their ini files, usually loaded from games.json next to settings.json:
+
+    {"skyrim": {"iniFiles": [{"name": "skyrim.ini", "role": "main", "priority": 0}, ...]},
+     "enderal": {"settings": "skyrim", "iniFiles": [...]}}
+
+settings names the game whose entries in settings.json apply, if it isn't the game itself. Game names are
+case insensitive"""
+
+    def __init__(self, games):
+        # the normalized contents of games.json, to check if a cache was built for the same games
+        self.data = {}
+        self.__iniFiles = {}
+        self.__fileNames = {}
+        self.__targets = {}
+        self.__settingsGames = {}
+        for gameName, game in games.items():
+            files = sorted((IniFile(str(entry["name"]), str(entry.get("role", MAIN)).lower(),
+                                    int(entry.get("priority", 0))) for entry in game["iniFiles"]),
+                           key=lambda iniFile: iniFile.priority)
+            for iniFile in files:
+                if iniFile.role not in INI_ROLES:
+                    raise ValueError("unknown role {0} of {1} for {2}".format(iniFile.role, iniFile.name, gameName))
+            targets = {iniFile.role: iniFile.name for iniFile in files}
+            if files and MAIN not in targets:
+                raise ValueError("no main ini file for {0}".format(gameName))
+            gameName = gameName.lower()
+            self.__iniFiles[gameName] = tuple(files)
+            self.__fileNames[gameName] = [iniFile.name for iniFile in files]
+            self.__targets[gameName] = targets
+            self.__settingsGames[gameName] = str(game.get("settings", gameName)).lower()
+            self.data[gameName] = (self.__settingsGames[gameName], self.__iniFiles[gameName])
+
+    @staticmethod
+    def load(path):
+        """reads the registry from a json file, raises IOError or ValueError if it can't be read"""
+        with open(path, "r", encoding="utf-8") as f:
+            games = json.load(f)
+        try:
+            return GameRegistry(games)
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError("invalid game registry {0}: {1}".format(path, e))
+
+    def games(self):
+        return self.__iniFiles.keys()
+
+    def iniFiles(self, gameName):
+        """returns the names of the ini files of the game, in the order they are applied"""
+        return self.__fileNames.get(gameName.lower(), [])
+
+    def iniFileEntries(self, gameName):
+        """returns the IniFile tuples of the game, by ascending priority"""
+        return self.__iniFiles.get(gameName.lower(), ())
+
+    def role(self, gameName, fileName):
+        """returns the role of an ini file of the game, None if it isn't one of its files"""
+        for iniFile in self.iniFileEntries(gameName):
+            if iniFile.name.lower() == fileName.lower():
+                return iniFile.role
+        return None
+
+    def targetFile(self, gameName, flags):
+        """returns the name of the ini file a setting with flags is written to, None if the game is unknown"""
+        targets = self.__targets.get(gameName.lower())
+        if not targets:
+            return None
+        for role in (CUSTOM, PREFS):
+            if role in flags and role in targets:
+                return targets[role]
+        return targets[MAIN]
+
+    def settingsGame(self, gameName):
+        """returns the name the settings of the game are listed under in settings.json"""
+        return self.__settingsGames.get(gameName.lower(), gameName.lower())
+
+
+class CaselessDict(object):
+    """Dictionary that enables case insensitive lookup while preserving the case of keys when they are listed.
+
+keys(), values() and items() return views or generators instead of copies"""
+
+    __slots__ = ("__keys", "__values")
+
+    def __init__(self):
+        # lowercase key -> key as inserted
+        self.__keys = {}
+        # lowercase key -> value
+        self.__values = {}
+
+    def __contains__(self, key):
+        return key.lower() in self.__values
+
+    def __getitem__(self, key):
+        return self.__values[key.lower()]
+
+    def __setitem__(self, key, value):
+        lower = key.lower()
+        self.__keys[lower] = key
+        self.__values[lower] = value
+
+    def __len__(self):
+        return len(self.__values)
+
+    def __iter__(self):
+        return iter(self.__keys.values())
+
+    def updateKey(self, key):
+        self.__keys[key.lower()] = key
+
+    def get(self, key, default=None):
+        return self.__values.get(key.lower(), default)
+
+    def keys(self):
+        return self.__keys.values()
+
+    def values(self):
+        return self.__values.values()
+
+    def items(self):
+        keys = self.__keys
+        return ((keys[lower], value) for lower, value in self.__values.items())
+
+
+class Setting(object):
+    """A setting of the database, resolved for one game. type is taken from the prefix of the key: b(ool),
+f(loat), i(nt), u(nsigned int), r(gb color) or s(tring). Settings are shared between all dialogs and never
+modified, their values are kept in a SettingsOverlay"""
+
+    __slots__ = ("section", "key", "type", "default", "flags", "description", "range", "step", "values",
+                 "file")
+
+    def __init__(self, section, key, data, fileName):
+        self.section = sys.intern(section)
+        self.key = sys.intern(key)
+        self.type = key[0].lower() if key[0].lower() in "bfiur" else 's'
+        self.default = data["default"]
+        self.flags = frozenset(data.get("flags", ()))
+        self.description = data.get("description")
+        self.range = (data["range"]["lower"], data["range"]["upper"]) if "range" in data else None
+        self.step = data.get("step")
+        self.values = tuple(data["values"]) if "values" in data else None
+        self.file = fileName
+
+
+class SettingsOverlay(object):
+    """The values of settings in one session of the dialog. Only values that differ from the default of
+their setting are stored, so the size depends on the number of edited or overridden settings"""
+
+    __slots__ = ("__values", "__saved")
+
+    def __init__(self):
+        # Setting -> current value
+        self.__values = {}
+        # Setting -> value in the ini file
+        self.__saved = {}
+
+    def __len__(self):
+        return len(self.__values) + len(self.__saved)
+
+    def value(self, setting):
+        return self.__values.get(setting, setting.default)
+
+    def saved(self, setting):
+        return self.__saved.get(setting, setting.default)
+
+    def isModified(self, setting):
+        return self.value(setting) != self.saved(setting)
+
+    @staticmethod
+    def __store(values, setting, value):
+        if value == setting.default:
+            values.pop(setting, None)
+        else:
+            values[setting] = value
+
+    def setValue(self, setting, value):
+        SettingsOverlay.__store(self.__values, setting, value)
+
+    def setSaved(self, setting, value):
+        SettingsOverlay.__store(self.__saved, setting, value)
+
+
+class LayeredValues(object):
+    """The values set by each ini file of a game, as layers by ascending priority. The effective value of a
+setting comes from the highest layer that sets it. It is resolved again when a layer changes, but only for
+the settings whose value in that layer changed"""
+
+    def __init__(self, fileNames):
+        # lower case file name -> Setting -> value, by ascending priority
+        self.__layers = collections.OrderedDict((fileName.lower(), {}) for fileName in fileNames)
+        self.__names = {fileName.lower(): fileName for fileName in fileNames}
+        self.__existing = set()
+        # Setting -> (value, file name) of the settings set by any layer
+        self.__effective = {}
+
+    def fileNames(self):
+        return [self.__names[name] for name in self.__layers]
+
+    def exists(self, fileName):
+        """returns whether the file of a layer existed when it was last set"""
+        return fileName.lower() in self.__existing
+
+    def setLayer(self, fileName, values, exists=True):
+        """replaces the values of a layer with values, a dict of Setting -> value. Returns the settings whose
+effective value or source changed"""
+        name = fileName.lower()
+        if exists:
+            self.__existing.add(name)
+        else:
+            self.__existing.discard(name)
+        previous = self.__layers[name]
+        self.__layers[name] = values
+        return self.__resolve([setting for setting in previous.keys() | values.keys()
+                               if setting not in previous or setting not in values
+                               or previous[setting] != values[setting]])
+
+    def setValue(self, fileName, setting, value):
+        """sets the value of a setting in one layer, returns the settings whose effective value changed"""
+        self.__layers[fileName.lower()][setting] = value
+        return self.__resolve([setting])
+
+    def __resolve(self, settings):
+        layers = list(reversed(self.__layers.items()))
+        changed = []
+        for setting in settings:
+            resolved = None
+            for name, values in layers:
+                if setting in values:
+                    resolved = (values[setting], self.__names[name])
+                    break
+            if resolved != self.__effective.get(setting):
+                if resolved is None:
+                    del self.__effective[setting]
+                else:
+                    self.__effective[setting] = resolved
+                changed.append(setting)
+        return changed
+
+    def value(self, setting):
+        effective = self.__effective.get(setting)
+        return setting.default if effective is None else effective[0]
+
+    def source(self, setting):
+        """returns the name of the file the effective value of setting comes from, None for the default"""
+        effective = self.__effective.get(setting)
+        return None if effective is None else effective[1]
+
+
+class SearchIndex(object):
+    """Inverted index over the key names, sections and descriptions of the settings of one game.
+
+Keys are split into words without their type prefix, so "fov" finds fDefaultWorldFOV, and are also indexed
+whole with the prefix, for names pasted from a guide. Every word of a query has to be a substring of a word
+of the setting"""
+
+    __wordPattern = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+    __queryPattern = re.compile(r"[a-z0-9_]+")
+
+    def __init__(self, sections):
+        self.__settings = []
+        # word -> indices into __settings
+        postings = {}
+        for section, entries in sections:
+            sectionWords = SearchIndex.__words(section)
+            for setting in entries:
+                words = set(sectionWords)
+                key = setting.key[1:] if setting.key[:1].islower() and setting.key[1:2].isupper() else setting.key
+                words.update(SearchIndex.__words(key))
+                words.add(key.lower())
+                words.add(setting.key.lower())
+                if setting.description:
+                    words.update(SearchIndex.__words(setting.description))
+                for word in words:
+                    postings.setdefault(word, []).append(len(self.__settings))
+                self.__settings.append(setting)
+        self.__postings = {word: frozenset(indices) for word, indices in postings.items()}
+        self.__vocabulary = tuple(self.__postings.keys())
+        # query word -> matching indices, queries are usually typed one character at a time
+        self.__matches = {}
+
+    @staticmethod
+    def __words(text):
+        return {word.lower() for word in SearchIndex.__wordPattern.findall(text)}
+
+    def __match(self, queryWord):
+        matches = self.__matches.get(queryWord)
+        if matches is None:
+            indices = set()
+            for word in self.__vocabulary:
+                if queryWord in word:
+                    indices.update(self.__postings[word])
+            matches = frozenset(indices)
+            if len(self.__matches) > 256:
+                self.__matches.clear()
+            self.__matches[queryWord] = matches
+        return matches
+
+    def search(self, query):
+        """returns the settings matching all words of query, in database order"""
+        queryWords = SearchIndex.__queryPattern.findall(query.lower())
+        if not queryWords:
+            return []
+        result = None
+        for queryWord in queryWords:
+            matches = self.__match(queryWord)
+            result = matches if result is None else result & matches
+            if not result:
+                return []
+        return [self.__settings[index] for index in sorted(result)]
+
+
+class SettingsDatabase(object):
+    """The settings database from settings.json, validated and indexed per game.
+
+The per game indices are kept in a pickled cache file next to the json file, or none if cachePath is
+None. The cache is keyed on the modification time and the hash of settings.json and is rebuilt whenever
+the source changes. The json data itself is only read to build missing indices and isn't kept.
+
+Unpickling runs code from the file, so a cache other users could have written is ignored."""
+
+    # increase whenever the layout of the cached data changes
+    CACHE_VERSION = 4
+
+    def __init__(self, jsonPath, cachePath, registry):
+        self.__jsonPath = jsonPath
+        self.__cachePath = cachePath
+        self.__registry = registry
+        # (mtime, size, hash) of the json file the indices were built from, None until loaded
+        self.__source = None
+        self.__gameIndex = {}
+        self.__gameSections = {}
+        self.__searchIndices = {}
+
+    def isLoaded(self):
+        return self.__source is not None
+
+    def settings(self):
+        """reads and validates settings.json, returns a dict of sections, each a dict of key -> setting data.
+The result isn't kept, use load() or gameSettings() for the indexed settings"""
+        with open(self.__jsonPath, "rb") as f:
+            return self.__validate(json.loads(f.read().decode("utf-8")))
+
+    def load(self, gameNames=None):
+        """builds the index of the games in gameNames, all games of the registry by default, unless the cache
+or an earlier call has it already. Missing indices are added to the cache"""
+        gameNames = self.__registry.games() if gameNames is None else [gameName.lower() for gameName in gameNames]
+        settings = None
+        changed = False
+        if self.__source is None:
+            stat = os.stat(self.__jsonPath)
+            cache = self.__readCache()
+            if cache is not None and cache["mtime"] == stat.st_mtime_ns and cache["size"] == stat.st_size:
+                digest = cache["hash"]
+                self.__gameIndex = cache["index"]
+            else:
+                with open(self.__jsonPath, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha1(data).hexdigest()
+                changed = True
+                if cache is not None and cache["hash"] == digest:
+                    # only touched, contents didn't change
+                    self.__gameIndex = cache["index"]
+                else:
+                    settings = self.__validate(json.loads(data.decode("utf-8")))
+                    self.__gameIndex = {}
+            self.__source = (stat.st_mtime_ns, stat.st_size, digest)
+
+        missing = [gameName for gameName in gameNames if gameName not in self.__gameIndex]
+        if missing:
+            if settings is None:
+                settings = self.settings()
+            for gameName in missing:
+                self.__gameIndex[gameName] = self.__buildGameIndex(gameName, settings)
+            changed = True
+        if changed:
+            self.__writeCache()
+
+    def gameSettings(self, gameName):
+        """returns the settings relevant to the specified game, as a tuple of (section, settings) pairs.
+The index is loaded or built on first use per game"""
+        gameName = gameName.lower()
+        index = self.__gameIndex.get(gameName)
+        if index is None:
+            self.load([gameName])
+            index = self.__gameIndex[gameName]
+        return index
+
+    def gameSections(self, gameName):
+        """returns the settings of the specified game as a CaselessDict of sections, each a CaselessDict of
+Setting objects. The result is shared and must not be modified"""
+        gameName = gameName.lower()
+        sections = self.__gameSections.get(gameName)
+        if sections is None:
+            sections = CaselessDict()
+            for sectionKey, entries in self.gameSettings(gameName):
+                section = CaselessDict()
+                for setting in entries:
+                    section[setting.key] = setting
+                sections[sectionKey] = section
+            self.__gameSections[gameName] = sections
+        return sections
+
+    def searchIndex(self, gameName):
+        """returns the SearchIndex for the settings of the specified game, it is built on first use"""
+        gameName = gameName.lower()
+        index = self.__searchIndices.get(gameName)
+        if index is None:
+            index = SearchIndex(self.gameSettings(gameName))
+            self.__searchIndices[gameName] = index
+        return index
+
+    def registry(self):
+        return self.__registry
+
+    def iniFiles(self, gameName):
+        return self.__registry.iniFiles(gameName)
+
+    def __buildGameIndex(self, gameName, settings):
+        settingsGame = self.__registry.settingsGame(gameName)
+        index = []
+        for sectionKey, section in settings.items():
+            entries = []
+            for key, setting in section.items():
+                if "games" in setting and settingsGame not in setting["games"]:
+                    # not for this game
+                    continue
+                fileName = self.__registry.targetFile(gameName, setting.get("flags", ()))
+                entries.append(Setting(sectionKey, key, setting, fileName))
+            if entries:
+                index.append((sectionKey, tuple(entries)))
+        return tuple(index)
+
+    @staticmethod
+    def __validSetting(key, setting):
+        if not isinstance(setting, dict) or "default" not in setting or not key:
+            return False
+        default = setting["default"]
+        keyType = key[0]
+        if keyType == 'b':
+            valid = isinstance(default, bool)
+        elif keyType == 'f':
+            valid = isinstance(default, (int, float)) and not isinstance(default, bool)
+        elif keyType == 'i' or keyType == 'u':
+            valid = isinstance(default, int) and not isinstance(default, bool)
+        else:
+            valid = isinstance(default, str)
+        if "range" in setting:
+            valid = valid and "lower" in setting["range"] and "upper" in setting["range"]
+        if "values" in setting:
+            valid = valid and isinstance(setting["values"], list)
+        return valid
+
+    def __validate(self, settings):
+        validated = {}
+        for sectionKey, section in settings.items():
+            validSection = {}
+            for key, setting in section.items():
+                if not SettingsDatabase.__validSetting(key, setting):
+                    logger.warning("invalid settings database entry {0} in section {1}".format(key, sectionKey))
+                    continue
+                if "games" in setting:
+                    setting["games"] = [game.lower() for game in setting["games"]]
+                validSection[str(key)] = setting
+            if validSection:
+                validated[str(sectionKey)] = validSection
+        return validated
+
+    def __readCache(self):
+        if self.__cachePath is None:
+            return None
+        try:
+            if not SettingsDatabase.__isPrivate(self.__cachePath):
+                logger.warning("ignoring settings cache {0}, it is writable by other users".format(self.__cachePath))
+                return None
+            with open(self.__cachePath, "rb") as f:
+                cache = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+        if not isinstance(cache, dict) or cache.get("version") != SettingsDatabase.CACHE_VERSION\
+                or cache.get("games") != self.__registry.data:
+            return None
+        return cache
+
+    @staticmethod
+    def __isPrivate(path):
+        """returns whether the file at path and its directory belong to the current user and can't be written
+by others. Always true where files have no owner, like on Windows"""
+        if not hasattr(os, "getuid"):
+            return True
+        for checked in (path, os.path.dirname(os.path.abspath(path))):
+            stat = os.stat(checked)
+            if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+                return False
+        return True
+
+    def __writeCache(self):
+        if self.__cachePath is None:
+            return
+        cache = {
+            "version": SettingsDatabase.CACHE_VERSION,
+            "mtime": self.__source[0],
+            "size": self.__source[1],
+            "hash": self.__source[2],
+            "games": self.__registry.data,
+            "index": self.__gameIndex,
+        }
+        try:
+            directory = os.path.dirname(os.path.abspath(self.__cachePath))
+            os.makedirs(directory, 0o700, exist_ok=True)
+            # a new file only the current user can write, a predictable name could be created by others first
+            fd, tempPath = tempfile.mkstemp(prefix=".pyCfg", suffix=".tmp", dir=directory)
+        except OSError as e:
+            # the cache is only an optimization, the plugin data directory may not be writable
+            logger.debug("failed to write settings cache {0}: {1}".format(self.__cachePath, e))
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(cache, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tempPath, self.__cachePath)
+        except OSError as e:
+            logger.debug("failed to write settings cache {0}: {1}".format(self.__cachePath, e))
+            try:
+                os.remove(tempPath)
+            except OSError:
+                pass
+
+
+def formatValue(value):
+    """formats a value the way it's written to an ini file"""
+    if type(value) == bool:
+        return '1' if value else '0'
+    return str(value)
+
+
+def applyIniRecords(settings, overlay, fileName, records, anyFile=False):
+    """applies the records parsed from the ini file fileName to the values in overlay. settings are the
+sections of the game as returned by SettingsDatabase.gameSections(). Records that fail validation with
+anything but a warning are skipped, the list of IniIssue found is returned"""
+    issues, accepted = validateIniRecords(settings, fileName, records, anyFile)
+    for setting, record in accepted:
+        overlay.setValue(setting, record.value)
+        overlay.setSaved(setting, record.value)
+    return issues
+
+
+def iniFileValues(settings, fileName, records, anyFile=False):
+    """returns the list of IniIssue found in the records of the ini file fileName and the values they set as
+a dict of Setting -> value. Like in the game, later records override earlier ones"""
+    issues, accepted = validateIniRecords(settings, fileName, records, anyFile)
+    return issues, {setting: record.value for setting, record in accepted}
+
+
+def writeSettings(basePath, changes, overlay, history=None):
+    """writes the values in overlay of the changed settings to the ini files in basePath. changes maps each
+ini file name to a list of settings, files without changes are not touched. If history is passed, the keys
+written are recorded in it as one entry. Returns the names of files that were skipped because they don't
+exist"""
+    missing = []
+    written = []
+    for fileName, fileChanges in changes.items():
+        filePath = basePath + "/" + fileName
+        if not os.path.exists(filePath):
+            missing.append(fileName)
+            continue
+        values = {}
+        for setting in fileChanges:
+            values.setdefault(setting.section, {})[setting.key] = formatValue(overlay.value(setting))
+        previous = patchIniFile(filePath, values)
+        for setting in fileChanges:
+            overlay.setSaved(setting, overlay.value(setting))
+        written.extend(Change(fileName, section, key, old, values[section][key])
+                       for (section, key), old in previous.items())
+    if history is not None:
+        try:
+            history.record(written)
+        except OSError as e:
+            # the files are written already, losing the undo step must not fail the save
+            logger.warning("failed to record settings history in {0}: {1}".format(history.path(), e))
+    return missing
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import collections
+
+from pyCfgIni import patchIniFile
+
+logger = logging.getLogger(__name__)
+
+# directory of the history store in a profile
+HISTORY_DIRECTORY = "pyCfg_history"
+
+# files of the history store, the entries as one json object per line and the position of undo/redo
+ENTRIES_FILE = "history.jsonl"
+STATE_FILE = "state.json"
+
+# a key changed by a save. old and new are its text in the ini file, None if the key isn't in the file
+Change = collections.namedtuple("Change", ["file", "section", "key", "old", "new"])
+
+# the changes of one save, time is seconds since the epoch
+HistoryEntry = collections.namedtuple("HistoryEntry", ["id", "time", "changes"])
+
+
+class SettingsHistory(object):
+    """Undo/redo history of the changes saved to the ini files of a profile. Every save is stored as the list
+of keys it changed with their old and new text, never as a copy of the files, so undoing a save only
+touches the keys it changed. Undone entries can be redone until the next save drops them.
+
+The store is a directory with one line per entry, pruned to the newest maxEntries entries and maxBytes
+bytes (0 for no limit) whenever a save is recorded"""
+
+    def __init__(self, path, maxEntries=50, maxBytes=512 * 1024):
+        self.__path = path
+        self.__maxEntries = maxEntries
+        self.__maxBytes = maxBytes
+        self.__entries = None
+        # serialized size of each entry in bytes
+        self.__sizes = []
+        # number of entries currently applied, the entries after it can be redone
+        self.__head = 0
+
+    def path(self):
+        return self.__path
+
+    def __load(self):
+        if self.__entries is not None:
+            return
+        self.__entries = []
+        self.__sizes = []
+        try:
+            with open(os.path.join(self.__path, ENTRIES_FILE), "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        data = json.loads(line)
+                        entry = HistoryEntry(int(data["id"]), float(data["time"]),
+                                             tuple(Change(*change) for change in data["changes"]))
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.warning("skipping damaged history entry in {0}: {1}".format(self.__path, e))
+                        continue
+                    self.__entries.append(entry)
+                    self.__sizes.append(len(line.encode("utf-8")))
+        except FileNotFoundError:
+            pass
+        self.__head = len(self.__entries)
+        try:
+            with open(os.path.join(self.__path, STATE_FILE), "r", encoding="utf-8") as f:
+                head = json.load(f)["head"]
+            self.__head = next((index + 1 for index, entry in enumerate(self.__entries) if entry.id == head), 0)
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("invalid history state in {0}: {1}".format(self.__path, e))
+
+    def entries(self):
+        """returns all entries, oldest first"""
+        self.__load()
+        return list(self.__entries)
+
+    def position(self):
+        """returns the number of entries currently applied"""
+        self.__load()
+        return self.__head
+
+    def canUndo(self):
+        return self.position() > 0
+
+    def canRedo(self):
+        self.__load()
+        return self.__head < len(self.__entries)
+
+    def size(self):
+        """returns the size of the stored entries in bytes"""
+        self.__load()
+        return sum(self.__sizes)
+
+    def record(self, changes, timestamp=None):
+        """adds an entry for a save that made changes, a list of Change. Entries that were undone are
+dropped. Returns the new entry, None if nothing changed"""
+        self.__load()
+        changes = tuple(change for change in changes if change.old != change.new)
+        if not changes:
+            return None
+        rewrite = self.__head < len(self.__entries)
+        del self.__entries[self.__head:]
+        del self.__sizes[self.__head:]
+        entry = HistoryEntry(self.__entries[-1].id + 1 if self.__entries else 1,
+                             time.time() if timestamp is None else timestamp, changes)
+        line = SettingsHistory.__line(entry)
+        self.__entries.append(entry)
+        self.__sizes.append(len(line.encode("utf-8")))
+        self.__head = len(self.__entries)
+        rewrite = self.__prune() or rewrite
+
+        os.makedirs(self.__path, exist_ok=True)
+        if rewrite:
+            self.__writeEntries()
+        else:
+            with open(os.path.join(self.__path, ENTRIES_FILE), "a", encoding="utf-8", newline="") as f:
+                f.write(line)
+        self.__writeState()
+        return entry
+
+    def __prune(self):
+        """drops the oldest entries beyond the limits, always keeping the newest. Returns whether any were
+dropped"""
+        count = 0
+        total = sum(self.__sizes)
+        while len(self.__entries) - count > 1 and \
+                ((self.__maxEntries > 0 and len(self.__entries) - count > self.__maxEntries) or
+                 (self.__maxBytes > 0 and total > self.__maxBytes)):
+            total -= self.__sizes[count]
+            count += 1
+        if count == 0:
+            return False
+        del self.__entries[:count]
+        del self.__sizes[:count]
+        self.__head = max(self.__head - count, 0)
+        return True
+
+    def undo(self, basePath):
+        """reverts the last applied entry in the ini files in basePath. Returns the changes reverted"""
+        if not self.canUndo():
+            return []
+        return self.__move(basePath, self.__head - 1)
+
+    def redo(self, basePath):
+        """applies the entry after the last applied one again. Returns the changes applied"""
+        if not self.canRedo():
+            return []
+        return self.__move(basePath, self.__head + 1)
+
+    def restore(self, basePath, timestamp):
+        """returns the ini files in basePath to the state after the last save at or before timestamp, undoing
+or redoing all entries in between. Each key is written once, with the value it had at that point. Returns
+the changes made"""
+        self.__load()
+        position = sum(1 for entry in self.__entries if entry.time <= timestamp)
+        return self.__move(basePath, position)
+
+    def __move(self, basePath, position):
+        self.__load()
+        # (file, section, key) -> text, the value of the entry closest to position wins
+        values = collections.OrderedDict()
+        if position < self.__head:
+            for entry in self.__entries[position:self.__head]:
+                for change in entry.changes:
+                    values.setdefault((change.file.lower(), change.section.lower(), change.key.lower()),
+                                      (change, change.old))
+        else:
+            for entry in reversed(self.__entries[self.__head:position]):
+                for change in entry.changes:
+                    values.setdefault((change.file.lower(), change.section.lower(), change.key.lower()),
+                                      (change, change.new))
+        files = collections.OrderedDict()
+        for change, value in values.values():
+            files.setdefault(change.file, {}).setdefault(change.section, {})[change.key] = value
+        applied = []
+        for fileName, sections in files.items():
+            filePath = os.path.join(basePath, fileName)
+            if not os.path.exists(filePath):
+                logger.warning("not restoring settings of missing file {0}".format(fileName))
+                continue
+            previous = patchIniFile(filePath, sections)
+            for (section, key), old in previous.items():
+                applied.append(Change(fileName, section, key, old, sections[section][key]))
+        self.__head = position
+        self.__writeState()
+        return applied
+
+    @staticmethod
+    def __line(entry):
+        return json.dumps({"id": entry.id, "time": entry.time, "changes": [list(change) for change in entry.changes]},
+                          separators=(",", ":")) + "\n"
+
+    def __writeEntries(self):
+        self.__replace(ENTRIES_FILE, "".join(SettingsHistory.__line(entry) for entry in self.__entries))
+
+    def __writeState(self):
+        head = self.__entries[self.__head - 1].id if self.__head > 0 else 0
+        self.__replace(STATE_FILE, json.dumps({"head": head}))
+
+    def __replace(self, fileName, content):
+        os.makedirs(self.__path, exist_ok=True)
+        fd, tempPath = tempfile.mkstemp(prefix=".pyCfg", suffix=".tmp", dir=self.__path)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(content)
+            os.replace(tempPath, os.path.join(self.__path, fileName))
+        except BaseException:
+            try:
+                os.remove(tempPath)
+            except OSError:
+                pass
+            raise
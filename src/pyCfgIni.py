@@ -0,0 +1,231 @@
+import os
+import shutil
+import tempfile
+import threading
+import collections
+
+# the encoding used for reading and writing ini files. Files written by the games are usually plain
+# ascii or cp1252, undecodable bytes are passed through unchanged
+INI_ENCODING = "utf-8"
+INI_ERRORS = "surrogateescape"
+
+# a single key=value assignment in an ini file. value is converted according to the type prefix of the key,
+# text is the value as written in the file and line the zero-based line number. If the text couldn't be
+# converted, valid is False and value is the text
+IniRecord = collections.namedtuple("IniRecord", ["section", "key", "value", "text", "line", "valid"])
+
+# path -> (mtime, size, records) of the most recently parsed files, least recently used first. A profile
+# has only a handful of ini files, the limit keeps batch runs over many profiles from keeping all of them
+PARSE_CACHE_SIZE = 32
+_parseCache = collections.OrderedDict()
+# files are parsed from the loader's thread pool and the batch workers, reordering the cache isn't atomic
+_parseCacheLock = threading.Lock()
+
+
+def _lineEnding(line):
+    if line.endswith("\r\n"):
+        return "\r\n"
+    elif line.endswith("\n") or line.endswith("\r"):
+        return line[-1]
+    return ""
+
+
+def _splitKeyLine(line):
+    """splits a key=value line into (prefix, key, value, suffix) so that prefix + value + suffix == line.
+returns None if the line doesn't assign a value"""
+    eq = line.find("=")
+    if eq <= 0:
+        return None
+    key = line[:eq].strip()
+    if not key:
+        return None
+    body = line[:len(line) - len(_lineEnding(line))]
+    valueStart = eq + 1
+    while valueStart < len(body) and body[valueStart] in " \t":
+        valueStart += 1
+    # inline comments start with // or with a ; following whitespace
+    valueEnd = body.find("//", valueStart)
+    if valueEnd == -1:
+        valueEnd = len(body)
+    semicolon = body.find(";", valueStart, valueEnd)
+    while semicolon != -1:
+        if body[semicolon - 1] in " \t":
+            valueEnd = semicolon
+            break
+        semicolon = body.find(";", semicolon + 1, valueEnd)
+    while valueEnd > valueStart and body[valueEnd - 1] in " \t":
+        valueEnd -= 1
+    return line[:valueStart], key, body[valueStart:valueEnd], line[valueEnd:]
+
+
+def _tokenize(lines):
+    """yields (line, section, parts) for each line. section is the name of the section the line belongs to.
+parts is (prefix, key, value, suffix) for key lines, True for section headers and None for anything else"""
+    section = None
+    for line in lines:
+        stripped = line.strip().lstrip("\ufeff")
+        if stripped.startswith("[") and "]" in stripped:
+            section = stripped[1:stripped.index("]")].strip()
+            yield line, section, True
+        elif section is None or not stripped or stripped[0] in ";#" or stripped.startswith("//"):
+            yield line, section, None
+        else:
+            yield line, section, _splitKeyLine(line)
+
+
+def convertValue(key, text):
+    """converts the text of a value according to the type prefix of its key. Raises ValueError if the text
+isn't valid for the type"""
+    keyType = key[0].lower()
+    if keyType == 'b':
+        return True if text == "1" else False
+    elif keyType == 'i' or keyType == 'u':
+        return int(text)
+    elif keyType == 'f':
+        return float(text)
+    return text
+
+
+def parseIniFile(path):
+    """returns the records of all key=value lines in the ini file at path, in file order and including
+duplicates. The result is reused as long as the file isn't modified"""
+    stat = os.stat(path)
+    with _parseCacheLock:
+        cached = _parseCache.get(path)
+        if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            _parseCache.move_to_end(path)
+            return cached[2]
+
+    records = []
+    with open(path, "r", encoding=INI_ENCODING, errors=INI_ERRORS, newline="") as f:
+        for lineNo, (line, section, parts) in enumerate(_tokenize(f)):
+            if parts is None or parts is True:
+                continue
+            key, text = parts[1], parts[2]
+            try:
+                records.append(IniRecord(section, key, convertValue(key, text), text, lineNo, True))
+            except ValueError:
+                records.append(IniRecord(section, key, text, text, lineNo, False))
+    records = tuple(records)
+    with _parseCacheLock:
+        _parseCache[path] = (stat.st_mtime_ns, stat.st_size, records)
+        _parseCache.move_to_end(path)
+        while len(_parseCache) > PARSE_CACHE_SIZE:
+            _parseCache.popitem(last=False)
+    return records
+
+
+def patchIniFile(path, changes):
+    """Writes changes into the ini file at path. changes maps section names to dicts of key -> value, values
+have to be strings already formatted for the ini file. Keys with the value None are removed.
+
+The file is streamed line by line: lines of changed keys are replaced in place, keeping their spelling,
+spacing and trailing comments, all other lines are copied unchanged. Keys missing from the whole file are
+appended to the first occurrence of their section, missing sections to the end of the file. The result is
+written to a temporary file that replaces the original once complete.
+
+Returns the previous values as a dict of (section, key) -> text, None for keys that weren't in the file"""
+    if not changes:
+        return {}
+
+    # section -> key -> (section name, key name, value), all lookups are case insensitive
+    pending = {}
+    for section, values in changes.items():
+        for key, value in values.items():
+            pending.setdefault(section.lower(), {})[key.lower()] = (section, key, value)
+    # keys anywhere in the file, a section may occur more than once and only a later occurrence have the key
+    present = set((record.section.lower(), record.key.lower()) for record in parseIniFile(path))
+    # (section, key) -> the text of the first occurrence of each changed key
+    previous = {}
+    written = set()
+    seenSections = set()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tempPath = tempfile.mkstemp(prefix=".pyCfg", suffix=".tmp", dir=directory)
+    try:
+        with open(path, "r", encoding=INI_ENCODING, errors=INI_ERRORS, newline="") as src,\
+                os.fdopen(fd, "w", encoding=INI_ENCODING, errors=INI_ERRORS, newline="") as dst:
+            newline = None
+            lastLine = ""
+            section = None
+            # comments and blank lines following the last key of a section with missing keys. These are
+            # written after the missing keys so the keys end up next to the other keys of the section
+            held = []
+
+            def appendMissing():
+                if section is None or section in seenSections:
+                    return
+                seenSections.add(section)
+                for key, (sectionName, keyName, value) in pending.get(section, {}).items():
+                    if (section, key) not in written and (section, key) not in present and value is not None:
+                        dst.write(keyName + "=" + value + (newline or os.linesep))
+                        written.add((section, key))
+
+            for line, name, parts in _tokenize(src):
+                if newline is None and _lineEnding(line):
+                    newline = _lineEnding(line)
+                keptLine, lastLine = lastLine, line
+                if parts is True:
+                    appendMissing()
+                    dst.writelines(held)
+                    held = []
+                    section = name.lower()
+                    dst.write(line)
+                    continue
+
+                if parts is None:
+                    if section in pending and section not in seenSections:
+                        held.append(line)
+                    else:
+                        dst.write(line)
+                    continue
+
+                dst.writelines(held)
+                held = []
+                prefix, key, value, suffix = parts
+                change = pending.get(section, {}).get(key.lower())
+                if change is not None:
+                    previous.setdefault((change[0], change[1]), value)
+                    written.add((section, key.lower()))
+                    if change[2] is None:
+                        lastLine = keptLine
+                        continue
+                    line = prefix + change[2] + suffix
+                dst.write(line)
+
+            newline = newline or os.linesep
+            appending = any(key not in seenSections and (key != section or
+                                                         any((key, k) not in written for k in values))
+                            and any(value is not None for _, _, value in values.values())
+                            for key, values in pending.items())
+            if appending and lastLine and not _lineEnding(lastLine):
+                if held:
+                    held[-1] += newline
+                else:
+                    dst.write(newline)
+            appendMissing()
+            dst.writelines(held)
+
+            for section, values in pending.items():
+                values = [(keyName, value) for _, keyName, value in values.values() if value is not None]
+                if section in seenSections or not values:
+                    continue
+                sectionName = next(iter(pending[section].values()))[0]
+                dst.write((newline if lastLine else "") + "[" + sectionName + "]" + newline)
+                for keyName, value in values:
+                    dst.write(keyName + "=" + value + newline)
+        shutil.copymode(path, tempPath)
+        os.replace(tempPath, path)
+        with _parseCacheLock:
+            _parseCache.pop(path, None)
+    except BaseException:
+        try:
+            os.remove(tempPath)
+        except OSError:
+            pass
+        raise
+
+    for section, values in changes.items():
+        for key in values:
+            previous.setdefault((section, key), None)
+    return previous
@@ -0,0 +1,98 @@
+import collections
+
+# problems found by validateIniRecords
+UNEXPECTED_SECTION = "unexpected section"
+UNKNOWN_SETTING = "unknown setting"
+WRONG_FILE = "wrong file"
+INVALID_VALUE = "invalid value"
+OUT_OF_RANGE = "out of range"
+DUPLICATE_SETTING = "duplicate setting"
+
+# problems that make the game ignore the setting, everything else is a warning
+ERRORS = frozenset([INVALID_VALUE])
+
+# a problem with a line of an ini file. expected is the file the setting belongs in for WRONG_FILE, the
+# allowed range or values for OUT_OF_RANGE and the line of the first occurrence for DUPLICATE_SETTING
+IniIssue = collections.namedtuple("IniIssue", ["problem", "file", "section", "key", "line", "text", "expected"])
+
+
+def _typeValid(setting, record):
+    if not record.valid:
+        return False
+    if setting.type == 'u':
+        return record.value >= 0
+    return True
+
+
+def validateIniRecords(settings, fileName, records, anyFile=False):
+    """checks all records parsed from the ini file fileName against settings, the sections of the game as
+returned by SettingsDatabase.gameSections(). Returns the list of IniIssue found and the list of
+(setting, record) pairs whose value can be used, in file order. Settings are accepted in any ini file of
+the game since they override each other, if anyFile is set they aren't reported either, like for the
+custom ini files meant to override the others"""
+    issues = []
+    accepted = []
+    firstLines = {}
+    for record in records:
+        section = settings.get(record.section)
+        if section is None:
+            issues.append(IniIssue(UNEXPECTED_SECTION, fileName, record.section, record.key, record.line,
+                                   record.text, None))
+            continue
+
+        setting = section.get(record.key)
+        if setting is None:
+            issues.append(IniIssue(UNKNOWN_SETTING, fileName, record.section, record.key, record.line,
+                                   record.text, None))
+            continue
+
+        # test if the setting is expected in this file
+        if not anyFile and "both" not in setting.flags and fileName.lower() != setting.file.lower():
+            issues.append(IniIssue(WRONG_FILE, fileName, record.section, record.key, record.line,
+                                   record.text, setting.file))
+
+        identity = (record.section.lower(), record.key.lower())
+        if identity in firstLines:
+            issues.append(IniIssue(DUPLICATE_SETTING, fileName, record.section, record.key, record.line,
+                                   record.text, firstLines[identity]))
+        else:
+            firstLines[identity] = record.line
+
+        if not _typeValid(setting, record):
+            issues.append(IniIssue(INVALID_VALUE, fileName, record.section, record.key, record.line,
+                                   record.text, None))
+            continue
+
+        if setting.range is not None and not setting.range[0] <= record.value <= setting.range[1]:
+            issues.append(IniIssue(OUT_OF_RANGE, fileName, record.section, record.key, record.line,
+                                   record.text, "{0} - {1}".format(setting.range[0], setting.range[1])))
+        elif setting.values is not None and record.value not in setting.values:
+            issues.append(IniIssue(OUT_OF_RANGE, fileName, record.section, record.key, record.line,
+                                   record.text, ", ".join(str(val) for val in setting.values)))
+        accepted.append((setting, record))
+    return issues, accepted
+
+
+def describeIssue(issue):
+    """returns a one line description of an IniIssue"""
+    where = "{0}:{1}: [{2}] {3}".format(issue.file, issue.line + 1, issue.section, issue.key)
+    if issue.problem == UNEXPECTED_SECTION:
+        return "{0}: unexpected section {1}".format(where, issue.section)
+    elif issue.problem == UNKNOWN_SETTING:
+        return "{0}: unknown setting".format(where)
+    elif issue.problem == WRONG_FILE:
+        return "{0}: belongs in {1}".format(where, issue.expected)
+    elif issue.problem == INVALID_VALUE:
+        return "{0}: invalid value {1}".format(where, issue.text)
+    elif issue.problem == OUT_OF_RANGE:
+        return "{0}: {1} is outside of {2}".format(where, issue.text, issue.expected)
+    else:
+        return "{0}: duplicate of line {1}".format(where, issue.expected + 1)
+
+
+def issueToJson(issue):
+    """returns an IniIssue as a json serializable dict"""
+    result = issue._asdict()
+    result["severity"] = "error" if issue.problem in ERRORS else "warning"
+    result["message"] = describeIssue(issue)
+    return result
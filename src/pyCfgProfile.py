@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import logging
+import threading
+import collections
+
+logger = logging.getLogger(__name__)
+
+# environment variables that enable profiling without changing the plugin settings. PYCFG_PROFILE enables
+# it if set to anything but 0, PYCFG_TRACE is the path a chrome trace (chrome://tracing, ui.perfetto.dev)
+# is written to
+PROFILE_VARIABLE = "PYCFG_PROFILE"
+TRACE_VARIABLE = "PYCFG_TRACE"
+
+
+class _NullPhase(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase(object):
+    __slots__ = ("__profiler", "__name", "__args", "__start")
+
+    def __init__(self, profiler, name, args):
+        self.__profiler = profiler
+        self.__name = name
+        self.__args = args
+        self.__start = 0.0
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.__profiler._record(self.__name, self.__start, time.perf_counter(), self.__args)
+        return False
+
+    def set(self, **args):
+        """adds values only known at the end of the phase, like the number of rows built"""
+        self.__args.update(args)
+
+
+class Profiler(object):
+    """Records wall time and number of calls of named phases. Each finished phase is logged as a line of
+key=value pairs, all of them can be written as a chrome trace. A disabled profiler only costs a method
+call per phase, so the phases stay in the code
+
+    with profiler.phase("updateTree", category="Display") as phase:
+        ...
+        phase.set(rows=len(rows))
+"""
+
+    def __init__(self, enabled=False, tracePath=None, log=None):
+        self.enabled = enabled
+        self.tracePath = tracePath
+        self.__log = log if log is not None else logger.info
+        self.__lock = threading.Lock()
+        # name -> [calls, total seconds, max seconds]
+        self.__stats = collections.OrderedDict()
+        self.__counters = collections.OrderedDict()
+        self.__events = []
+        self.__origin = time.perf_counter()
+
+    def phase(self, name, **args):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name, args)
+
+    def count(self, name, amount=1):
+        """adds amount to the counter name"""
+        if self.enabled:
+            with self.__lock:
+                self.__counters[name] = self.__counters.get(name, 0) + amount
+
+    def _record(self, name, start, end, args):
+        duration = end - start
+        with self.__lock:
+            stats = self.__stats.get(name)
+            if stats is None:
+                stats = self.__stats[name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+            if self.tracePath:
+                self.__events.append({"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                                      "ts": (start - self.__origin) * 1e6, "dur": duration * 1e6, "args": args})
+        self.__log(Profiler.__line("pyCfg.profile", phase=name, ms="{0:.3f}".format(duration * 1000.0), **args))
+
+    @staticmethod
+    def __line(prefix, **values):
+        return prefix + "".join(" {0}={1}".format(key, json.dumps(value) if isinstance(value, str) and " " in value
+                                                  else value) for key, value in values.items())
+
+    def stats(self):
+        """returns name -> (calls, total seconds, max seconds) of all recorded phases"""
+        with self.__lock:
+            return collections.OrderedDict((name, tuple(stats)) for name, stats in self.__stats.items())
+
+    def counters(self):
+        with self.__lock:
+            return collections.OrderedDict(self.__counters)
+
+    def reset(self):
+        with self.__lock:
+            self.__stats.clear()
+            self.__counters.clear()
+            self.__events = []
+            self.__origin = time.perf_counter()
+
+    def flush(self):
+        """logs a summary line per phase and counter and writes the trace if a trace path is set"""
+        if not self.enabled:
+            return
+        for name, (calls, total, longest) in self.stats().items():
+            self.__log(Profiler.__line("pyCfg.profile.summary", phase=name, calls=calls,
+                                       total_ms="{0:.3f}".format(total * 1000.0),
+                                       max_ms="{0:.3f}".format(longest * 1000.0)))
+        for name, value in self.counters().items():
+            self.__log(Profiler.__line("pyCfg.profile.summary", counter=name, value=value))
+        if self.tracePath:
+            self.writeTrace(self.tracePath)
+
+    def writeTrace(self, path):
+        """writes the recorded phases in the chrome trace event format"""
+        with self.__lock:
+            events = list(self.__events)
+            counters = dict(self.__counters)
+        if counters:
+            events.append({"name": "counters", "ph": "C", "pid": os.getpid(), "tid": 0,
+                           "ts": (time.perf_counter() - self.__origin) * 1e6, "args": counters})
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        except OSError as e:
+            logger.warning("failed to write profiling trace {0}: {1}".format(path, e))
+
+
+def createProfiler(enabled=False, tracePath=None, log=None):
+    """returns a Profiler that is enabled if enabled is set or the PYCFG_PROFILE environment variable is set.
+tracePath defaults to PYCFG_TRACE"""
+    variable = os.environ.get(PROFILE_VARIABLE, "")
+    enabled = bool(enabled) or (variable != "" and variable != "0")
+    return Profiler(enabled, tracePath or os.environ.get(TRACE_VARIABLE) or None, log)
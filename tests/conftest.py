@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+import atexit
+import shutil
+import tempfile
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(os.path.dirname(TEST_DIR), "src")
+BENCHMARK_DIR = os.path.join(os.path.dirname(TEST_DIR), "benchmarks")
+
+# the plugin modules and the mobase stand-in used outside of Mod Organizer
+sys.path[:0] = [SOURCE_DIR, BENCHMARK_DIR]
+
+
+def _compileDialog():
+    """generates the dialog class from the ui file like the build does, once per test run"""
+    from PyQt6 import uic
+    directory = tempfile.mkdtemp(prefix="pyCfgTests")
+    with open(os.path.join(SOURCE_DIR, "pyCfgDialog.ui"), "r", encoding="utf-8") as source,\
+            open(os.path.join(directory, "pyCfgDialog.py"), "w", encoding="utf-8") as target:
+        uic.compileUi(source, target)
+    sys.path.insert(0, directory)
+    atexit.register(shutil.rmtree, directory, True)
+
+
+try:
+    _compileDialog()
+except ImportError:
+    pass
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+# a small settings database for one game, with settings of each type and every kind of constraint
+GAME_SETTINGS = {
+    "Display": {
+        "iSize W": {"default": 1920, "flags": ["prefs"]},
+        "fGamma": {"default": 1.0, "flags": ["prefs", "both"]},
+        "iShadowMode": {"default": 1, "values": [1, 2, 3]},
+        "bFull Screen": {"default": True, "flags": ["prefs"]},
+    },
+    "General": {
+        "uGridsToLoad": {"default": 5, "range": {"lower": 1, "upper": 11}},
+        "uExterior Cell Buffer": {"default": 36},
+        "fDefaultFOV": {"default": 75.0},
+        "sLanguage": {"default": "ENGLISH"},
+    },
+}
+
+GAME_REGISTRY = {
+    "skyrim": {"iniFiles": [{"name": "skyrim.ini", "role": "main", "priority": 0},
+                            {"name": "skyrimprefs.ini", "role": "prefs", "priority": 1},
+                            {"name": "skyrimcustom.ini", "role": "custom", "priority": 2}]},
+}
+
+
+@pytest.fixture
+def gameData(tmp_path):
+    """returns the path of a settings.json with GAME_SETTINGS, with games.json next to it"""
+    directory = tmp_path / "data"
+    directory.mkdir()
+    (directory / "settings.json").write_text(json.dumps(GAME_SETTINGS), encoding="utf-8")
+    (directory / "games.json").write_text(json.dumps(GAME_REGISTRY), encoding="utf-8")
+    return str(directory / "settings.json")
@@ -0,0 +1,173 @@
+"""IniFileWatcher and the reload of ini files changed while the dialog is open, on a temporary profile"""
+
+import os
+import time
+import shutil
+
+import pytest
+
+from conftest import SOURCE_DIR
+from pyCfgIni import patchIniFile
+
+PREFS = "[Display]\r\niSize W=1920\r\niSize H=1080\r\n"
+
+
+def waitFor(qapp, condition, timeout=2.0):
+    """processes events until condition() is true, returns whether it became true before timeout"""
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        qapp.processEvents()
+        if condition():
+            return True
+        time.sleep(0.01)
+    qapp.processEvents()
+    return condition()
+
+
+def settle(qapp, seconds=0.4):
+    waitFor(qapp, lambda: False, seconds)
+
+
+def writeFile(path, content):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def watched(qapp, tmp_path):
+    import pyCfg
+    path = str(tmp_path / "skyrimprefs.ini")
+    writeFile(path, PREFS)
+    watcher = pyCfg.IniFileWatcher([path], delay=50)
+    changes = []
+    watcher.fileChanged.connect(changes.append)
+    yield watcher, path, changes
+    watcher.deleteLater()
+
+
+def testExternalEditIsReportedOnce(qapp, watched):
+    watcher, path, changes = watched
+    writeFile(path, PREFS + "iSize W=800\r\n")
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        f.write("; and a comment\r\n")
+    assert waitFor(qapp, lambda: changes)
+    settle(qapp)
+    assert changes == [path]
+
+
+def testReplacedFileIsReportedAndStillWatched(qapp, watched, tmp_path):
+    watcher, path, changes = watched
+    # editors and patchIniFile save by writing a new file and renaming it over the old one
+    temporary = str(tmp_path / "skyrimprefs.ini.tmp")
+    writeFile(temporary, PREFS.replace("1920", "1280"))
+    os.replace(temporary, path)
+    assert waitFor(qapp, lambda: changes)
+    settle(qapp)
+    assert changes == [path]
+
+    writeFile(path, PREFS.replace("1920", "800"))
+    assert waitFor(qapp, lambda: len(changes) == 2)
+    assert changes == [path, path]
+
+
+def testAcknowledgedChangeIsNotReported(qapp, watched):
+    watcher, path, changes = watched
+    patchIniFile(path, {"Display": {"iSize W": "1280"}})
+    watcher.acknowledge(path)
+    settle(qapp)
+    assert changes == []
+
+
+def testUnchangedFileIsNotReported(qapp, watched):
+    watcher, path, changes = watched
+    stat = os.stat(path)
+    writeFile(path, PREFS)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    settle(qapp)
+    assert changes == []
+
+
+@pytest.fixture
+def plugin(qapp, tmp_path):
+    import mock_mobase as mobase
+    import pyCfg
+    dataPath = tmp_path / "data"
+    profilePath = tmp_path / "profile"
+    dataPath.mkdir()
+    profilePath.mkdir()
+    for fileName in ("settings.json", "games.json"):
+        shutil.copyfile(os.path.join(SOURCE_DIR, fileName), str(dataPath / fileName))
+    writeFile(str(profilePath / "skyrim.ini"), "[General]\r\nsLanguage=ENGLISH\r\n")
+    writeFile(str(profilePath / "skyrimprefs.ini"), PREFS)
+    organizer = mobase.Organizer(str(dataPath), mobase.Game("Skyrim", str(profilePath)),
+                                 mobase.Profile(str(profilePath)), {"history_entries": 0})
+    plugin = pyCfg.createPlugin()
+    assert plugin.init(organizer)
+    return plugin, str(profilePath / "skyrimprefs.ini")
+
+
+def runDialog(monkeypatch, plugin, scenario):
+    """runs scenario(window) in place of the event loop of the dialog and returns its result"""
+    import pyCfg
+    result = []
+    monkeypatch.setattr(pyCfg.MainWindow, "exec", lambda window: result.append(scenario(window)))
+    plugin.display()
+    return result[0]
+
+
+def showSetting(qapp, window, section, key):
+    assert waitFor(qapp, lambda: not window.windowTitle().endswith("(loading...)"))
+    # the display settings aren't basic ones
+    window._MainWindow__ui.advancedButton.setChecked(True)
+    # the search ignores the type prefix of keys
+    window._MainWindow__ui.searchEdit.setText(key[1:])
+    model = window._MainWindow__model
+    return model, model.indexForKey(section, key), model.settingForKey(section, key)
+
+
+def testExternalEditUpdatesTheDialog(qapp, monkeypatch, plugin):
+    plugin, path = plugin
+
+    def scenario(window):
+        model, index, setting = showSetting(qapp, window, "Display", "iSize W")
+        assert model.data(index) == "1920"
+        writeFile(path, PREFS.replace("1920", "800"))
+        assert waitFor(qapp, lambda: model.data(index) == "800")
+        return window._MainWindow__conflicts, window._MainWindow__ui.saveButton.isEnabled()
+
+    assert runDialog(monkeypatch, plugin, scenario) == (set(), False)
+
+
+def testExternalEditOfPendingEditIsAConflict(qapp, monkeypatch, plugin):
+    plugin, path = plugin
+
+    def scenario(window):
+        model, index, setting = showSetting(qapp, window, "Display", "iSize W")
+        model.setData(index, 1280)
+        writeFile(path, PREFS.replace("1920", "800"))
+        assert waitFor(qapp, lambda: window._MainWindow__conflicts)
+        overlay = window._MainWindow__overlay
+        return (window._MainWindow__conflicts == {setting}, overlay.value(setting), overlay.saved(setting),
+                window._MainWindow__ui.saveButton.isEnabled())
+
+    assert runDialog(monkeypatch, plugin, scenario) == (True, 1280, 800, True)
+
+
+def testSaveIsNotReportedAsExternalEdit(qapp, monkeypatch, plugin):
+    import pyCfg
+    plugin, path = plugin
+    reloads = []
+    monkeypatch.setattr(pyCfg.MainWindow, "settingsReloaded",
+                        lambda window, settings, conflicts: reloads.append(settings))
+
+    def scenario(window):
+        model, index, setting = showSetting(qapp, window, "Display", "iSize W")
+        model.setData(index, 1280)
+        window._MainWindow__save()
+        settle(qapp)
+        return model.data(index), window._MainWindow__ui.saveButton.isEnabled()
+
+    assert runDialog(monkeypatch, plugin, scenario) == ("1280", False)
+    assert reloads == []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        assert f.read() == PREFS.replace("1920", "1280")
@@ -0,0 +1,190 @@
+"""The settings dialog on its own, with settings built in the test instead of loaded from settings.json"""
+
+import pytest
+
+from pyCfgDatabase import CaselessDict, Setting, SettingsOverlay, SearchIndex
+
+
+def makeSections(entries):
+    """returns the sections for MainWindow from {section: {key: data}}"""
+    sections = CaselessDict()
+    for section, settings in entries.items():
+        sections[section] = CaselessDict()
+        for key, data in settings.items():
+            sections[section][key] = Setting(section, key, data, "test.ini")
+    return sections
+
+
+@pytest.fixture
+def window(qapp):
+    import pyCfg
+    sections = makeSections({
+        "Light": {"fDecalLODFadeEnd": {"default": 0.4, "flags": ["basic"]}},
+        "LightingShader": {"fDecalLODFadeEnd": {"default": 0.6, "flags": ["basic"]}},
+    })
+    overlay = SettingsOverlay()
+    window = pyCfg.MainWindow(sections, overlay, searchIndex=SearchIndex(
+        (section, list(sections[section].values())) for section in sections.keys()), commitDelay=0)
+    yield window, sections, overlay
+    window.deleteLater()
+
+
+def searchRows(window, query):
+    window._MainWindow__ui.searchEdit.setText(query)
+    model = window._MainWindow__model
+    return model, [model.setting(model.index(row, 1)) for row in range(model.rowCount())]
+
+
+def testEditOfKeySharedBySectionsIsSaved(window):
+    window, sections, overlay = window
+    model, rows = searchRows(window, "decallodfadeend")
+    assert sorted(setting.section for setting in rows) == ["Light", "LightingShader"]
+
+    for setting in rows:
+        assert model.settingForKey(setting.section, setting.key) is setting
+    light = sections["Light"]["fDecalLODFadeEnd"]
+    model.setData(model.indexForKey("light", "fdecallodfadeend"), 1.5)
+
+    assert overlay.value(light) == 1.5
+    assert overlay.value(sections["LightingShader"]["fDecalLODFadeEnd"]) == 0.6
+    assert window._MainWindow__dirty == {light}
+    assert window._MainWindow__ui.saveButton.isEnabled()
+
+    saved = []
+    window.saveSettings.connect(saved.append)
+    window._MainWindow__save()
+    assert saved == [{"test.ini": [light]}]
+
+
+def testReloadRefreshesTheRowOfItsSection(window):
+    window, sections, overlay = window
+    model, rows = searchRows(window, "decallodfadeend")
+    shader = sections["LightingShader"]["fDecalLODFadeEnd"]
+    refreshed = []
+    model.dataChanged.connect(lambda topLeft, bottomRight: refreshed.append(model.setting(topLeft)))
+    overlay.setSaved(shader, 0.9)
+    overlay.setValue(shader, 0.9)
+    window.settingsReloaded([shader], [])
+    assert refreshed == [shader]
+
+
+def testSettingsOfSkippedFilesStayUnsaved(window):
+    window, sections, overlay = window
+    model, rows = searchRows(window, "decallodfadeend")
+    for setting in rows:
+        model.setData(model.indexForKey(setting.section, setting.key), 2.0)
+    light = sections["Light"]["fDecalLODFadeEnd"]
+    shader = sections["LightingShader"]["fDecalLODFadeEnd"]
+
+    def save(changes):
+        # like IniEdit when the file of the [LightingShader] setting is missing
+        overlay.setSaved(light, overlay.value(light))
+    window.saveSettings.connect(save)
+    window._MainWindow__save()
+
+    assert window._MainWindow__dirty == {shader}
+    assert window._MainWindow__ui.saveButton.isEnabled()
+
+
+def testRestoreChoosesTheSelectedSaveOfTheSameSecond(qapp, tmp_path, monkeypatch):
+    import pyCfg
+    from pyCfgHistory import Change, SettingsHistory
+    history = SettingsHistory(str(tmp_path / "history"))
+    first = history.record([Change("test.ini", "Light", "fDecalLODFadeEnd", None, "1.0")], 1000.25)
+    history.record([Change("test.ini", "Light", "fDecalLODFadeEnd", "1.0", "2.0")], 1000.5)
+    history.record([Change("test.ini", "Light", "fDecalLODFadeEnd", "2.0", "3.0")], 2000.0)
+    sections = makeSections({"Light": {"fDecalLODFadeEnd": {"default": 0.4, "flags": ["basic"]}}})
+    window = pyCfg.MainWindow(sections, SettingsOverlay(), history=history)
+
+    shown = []
+
+    def choose(parent, title, label, items, current, editable):
+        shown.extend(items)
+        # newest first, the oldest of the two saves within the same second
+        return items[2], True
+    monkeypatch.setattr(pyCfg.QInputDialog, "getItem", staticmethod(choose))
+    restored = []
+    window.restoreRequested.connect(restored.append)
+    window._MainWindow__historyClicked()
+
+    assert len(set(shown)) == len(shown)
+    assert restored == [first.time]
+    window.deleteLater()
+
+
+def testMovingTheSelectionDoesntChangeValues(qapp):
+    import pyCfg
+    sections = makeSections({"Display": {
+        "fFirstPersonSittingAngleLimit": {"default": 1.570796, "flags": ["basic"]},
+        "iShadowMode": {"default": 1, "values": [1, 2, 3], "flags": ["basic"]},
+        "iTextureQuality": {"default": 1, "range": {"lower": 0, "upper": 3}, "flags": ["basic"]},
+        "fSmallValue": {"default": 0.1, "flags": ["basic"]},
+    }})
+    overlay = SettingsOverlay()
+    loaded = {"fFirstPersonSittingAngleLimit": 1.570796, "iShadowMode": 7, "iTextureQuality": 9, "fSmallValue": 0.00012}
+    for key, value in loaded.items():
+        # like loading an ini file with values the editors can't show as they are
+        overlay.setSaved(sections["Display"][key], value)
+        overlay.setValue(sections["Display"][key], value)
+    window = pyCfg.MainWindow(sections, overlay, commitDelay=0)
+    window.show()
+    window._MainWindow__ui.categorySelection.setCurrentIndex(window._MainWindow__ui.categorySelection.findText("Display"))
+    model = window._MainWindow__model
+    tree = window._MainWindow__ui.settingsTree
+    assert model.rowCount() == len(loaded)
+
+    for row in list(range(model.rowCount())) + [0]:
+        tree.setCurrentIndex(model.index(row, 1))
+        qapp.processEvents()
+
+    for key, value in loaded.items():
+        assert not overlay.isModified(sections["Display"][key])
+        assert overlay.value(sections["Display"][key]) == value
+    assert not window._MainWindow__ui.saveButton.isEnabled()
+    window.deleteLater()
+
+
+def testBooleansCanBeToggledWithTheKeyboard(qapp):
+    import pyCfg
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtTest import QTest
+    sections = makeSections({"Display": {"bFull Screen": {"default": False, "flags": ["basic"]}}})
+    setting = sections["Display"]["bFull Screen"]
+    overlay = SettingsOverlay()
+    window = pyCfg.MainWindow(sections, overlay, commitDelay=0)
+    window.show()
+    window._MainWindow__ui.categorySelection.setCurrentIndex(window._MainWindow__ui.categorySelection.findText("Display"))
+    tree = window._MainWindow__ui.settingsTree
+    tree.setFocus()
+    tree.setCurrentIndex(window._MainWindow__model.index(0, 0))
+
+    values = []
+    for key in (Qt.Key.Key_Space, Qt.Key.Key_Return, Qt.Key.Key_Enter):
+        QTest.keyClick(tree, key)
+        values.append(overlay.value(setting))
+    assert values == [True, False, True]
+    window.deleteLater()
+
+
+def testPendingEditIsKeptWhenTheCategoryChanges(qapp):
+    import pyCfg
+    sections = makeSections({
+        "General": {"uGridsToLoad": {"default": 5, "flags": ["basic"]}},
+        "Display": {"fGamma": {"default": 1.0, "flags": ["basic"]}},
+    })
+    setting = sections["General"]["uGridsToLoad"]
+    overlay = SettingsOverlay()
+    # long enough not to commit before the category is changed
+    window = pyCfg.MainWindow(sections, overlay, commitDelay=10000)
+    window.show()
+    categories = window._MainWindow__ui.categorySelection
+    categories.setCurrentIndex(categories.findText("General"))
+    tree = window._MainWindow__ui.settingsTree
+    index = window._MainWindow__model.index(0, 1)
+    tree.setCurrentIndex(index)
+    tree.indexWidget(index).setValue(42)
+
+    categories.setCurrentIndex(categories.findText("Display"))
+    assert overlay.value(setting) == 42
+    assert window._MainWindow__ui.saveButton.isEnabled()
+    window.deleteLater()
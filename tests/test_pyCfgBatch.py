@@ -0,0 +1,131 @@
+"""The headless batch tool: preset validation, applying presets to profiles and the command line"""
+
+import os
+import json
+
+import pytest
+
+import pyCfgBatch
+from pyCfgHistory import HISTORY_DIRECTORY
+
+SKYRIM_INI = b"[General]\r\nuGridsToLoad=5\r\nsLanguage=ENGLISH\r\n"
+PREFS_INI = b"[Display]\r\niSize W=1920\r\n"
+
+
+def run(gameData, *args):
+    return pyCfgBatch.main(["--settings", gameData, "--cache", "", "--game", "skyrim"] + list(args))
+
+
+@pytest.fixture
+def profiles(tmp_path):
+    paths = []
+    for name in ("first", "second"):
+        profile = tmp_path / name
+        profile.mkdir()
+        (profile / "skyrim.ini").write_bytes(SKYRIM_INI)
+        (profile / "skyrimprefs.ini").write_bytes(PREFS_INI)
+        paths.append(str(profile))
+    return paths
+
+
+def readBytes(profile, fileName):
+    with open(os.path.join(profile, fileName), "rb") as f:
+        return f.read()
+
+
+def writePreset(tmp_path, name, content):
+    path = tmp_path / name
+    if isinstance(content, dict):
+        path.write_text(json.dumps(content), encoding="utf-8")
+    else:
+        path.write_bytes(content)
+    return str(path)
+
+
+@pytest.mark.parametrize("name, content", [
+    ("preset.ini", b"[General]\r\nuGridsToLoad=x\r\nuGridsToLoad=13\r\nuExterior Cell Buffer=-1\r\n"
+                   b"sUnknown=1\r\n[Display]\r\niShadowMode=4\r\n"),
+    ("preset.json", {"General": {"uGridsToLoad": "x", "uExterior Cell Buffer": -1, "sUnknown": 1},
+                     "Display": {"iShadowMode": 4}}),
+])
+def testPresetErrors(gameData, tmp_path, profiles, capsys, name, content):
+    preset = writePreset(tmp_path, name, content)
+    if name.endswith(".json"):
+        # a json object can't have the same key twice
+        expected = []
+    else:
+        expected = ["[General] uGridsToLoad: 13 is out of range (1 - 11)"]
+    expected = ["[General] uGridsToLoad: invalid value {0}".format("x" if name.endswith(".ini") else '"x"')] +\
+        expected + ["[General] uExterior Cell Buffer: invalid value -1",
+                    "[General] sUnknown: not a setting of this game",
+                    "[Display] iShadowMode: 4 is not one of 1, 2, 3"]
+
+    assert run(gameData, "apply", preset, *profiles) == 2
+    errors = capsys.readouterr().err.splitlines()
+    assert errors == ["{0}: {1}".format(preset, error) for error in expected]
+    for profile in profiles:
+        assert readBytes(profile, "skyrim.ini") == SKYRIM_INI
+        assert not os.path.exists(os.path.join(profile, HISTORY_DIRECTORY))
+
+
+def testJsonPresetTypes(gameData, tmp_path, profiles, capsys):
+    preset = writePreset(tmp_path, "preset.json", {"General": {"uGridsToLoad": 7.5, "fDefaultFOV": "wide",
+                                                               "sLanguage": 1}})
+    assert run(gameData, "apply", preset, *profiles) == 2
+    assert capsys.readouterr().err.splitlines() == [
+        "{0}: [General] uGridsToLoad: invalid value 7.5".format(preset),
+        "{0}: [General] fDefaultFOV: invalid value \"wide\"".format(preset),
+        "{0}: [General] sLanguage: invalid value 1".format(preset)]
+
+
+def testDryRunOnlyReportsTheChanges(gameData, tmp_path, profiles, capsys):
+    preset = writePreset(tmp_path, "preset.ini", b"[General]\r\nuGridsToLoad=7\r\nsLanguage=ENGLISH\r\n"
+                                                 b"[Display]\r\niSize W=1280\r\nbFull Screen=0\r\n")
+    assert run(gameData, "apply", "--dry-run", preset, profiles[0]) == 0
+    assert capsys.readouterr().out.splitlines() == [
+        "{0}: 3 change(s)".format(profiles[0]),
+        "  skyrim.ini [General] uGridsToLoad: 5 -> 7",
+        "  skyrimprefs.ini [Display] iSize W: 1920 -> 1280",
+        "  skyrimprefs.ini [Display] bFull Screen: 1 -> 0",
+    ]
+    assert readBytes(profiles[0], "skyrim.ini") == SKYRIM_INI
+    assert readBytes(profiles[0], "skyrimprefs.ini") == PREFS_INI
+    assert not os.path.exists(os.path.join(profiles[0], HISTORY_DIRECTORY))
+
+
+def testApplyToProfiles(gameData, tmp_path, profiles, capsys):
+    # the second profile overrides the setting in its custom file, the value is written there
+    with open(os.path.join(profiles[1], "skyrimcustom.ini"), "wb") as f:
+        f.write(b"[General]\r\nuGridsToLoad=9\r\n")
+    preset = writePreset(tmp_path, "preset.json", {"General": {"uGridsToLoad": 7}, "Display": {"iSize W": 1280}})
+
+    assert run(gameData, "--jobs", "2", "apply", preset, *profiles) == 0
+    assert readBytes(profiles[0], "skyrim.ini") == SKYRIM_INI.replace(b"=5", b"=7")
+    assert readBytes(profiles[0], "skyrimprefs.ini") == PREFS_INI.replace(b"1920", b"1280")
+    assert readBytes(profiles[1], "skyrim.ini") == SKYRIM_INI
+    assert readBytes(profiles[1], "skyrimcustom.ini") == b"[General]\r\nuGridsToLoad=7\r\n"
+    assert readBytes(profiles[1], "skyrimprefs.ini") == PREFS_INI.replace(b"1920", b"1280")
+    output = capsys.readouterr().out.splitlines()
+    assert "{0}: 2 change(s)".format(profiles[0]) in output
+    assert "  skyrimcustom.ini [General] uGridsToLoad: 9 -> 7" in output
+
+    # applying again changes nothing, undo returns to the original files
+    assert run(gameData, "apply", preset, *profiles) == 0
+    assert capsys.readouterr().out.splitlines()[0] == "{0}: 0 change(s)".format(profiles[0])
+    assert run(gameData, "undo", *profiles) == 0
+    assert readBytes(profiles[0], "skyrim.ini") == SKYRIM_INI
+    assert readBytes(profiles[0], "skyrimprefs.ini") == PREFS_INI
+    assert readBytes(profiles[1], "skyrimcustom.ini") == b"[General]\r\nuGridsToLoad=9\r\n"
+
+
+def testMissingFilesAreReported(gameData, tmp_path, capsys):
+    preset = writePreset(tmp_path, "preset.ini", b"[Display]\r\niSize W=1280\r\n")
+    assert run(gameData, "apply", "--no-history", preset, str(tmp_path)) == 0
+    assert "  skyrimprefs.ini doesn't exist, not written" in capsys.readouterr().out
+    assert not os.path.exists(str(tmp_path / "skyrimprefs.ini"))
+
+
+def testUnsupportedGame(gameData, tmp_path, capsys):
+    code = pyCfgBatch.main(["--settings", gameData, "--cache", "", "--game", "morrowind", "lint", str(tmp_path)])
+    assert code == 2
+    assert "unsupported game morrowind" in capsys.readouterr().err
@@ -0,0 +1,133 @@
+"""Loading and caching of the settings database"""
+
+import os
+import json
+import pickle
+
+import pytest
+
+from pyCfgDatabase import GameRegistry, SettingsDatabase, SearchIndex, Setting
+
+SETTINGS = {
+    "Display": {
+        "iSize W": {"default": 640, "flags": ["prefs"]},
+        "fGamma": {"default": 1.0, "games": ["skyrim"]},
+    },
+    "Fallout": {
+        "bPipBoy": {"default": True, "games": ["fallout4"]},
+    },
+}
+
+GAMES = {
+    "skyrim": {"iniFiles": [{"name": "skyrim.ini", "role": "main", "priority": 0},
+                            {"name": "skyrimprefs.ini", "role": "prefs", "priority": 1}]},
+    "fallout4": {"iniFiles": [{"name": "fallout4.ini", "role": "main", "priority": 0},
+                              {"name": "fallout4prefs.ini", "role": "prefs", "priority": 1}]},
+    "enderal": {"settings": "skyrim", "iniFiles": [{"name": "enderal.ini", "role": "main", "priority": 0}]},
+}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    jsonPath = tmp_path / "settings.json"
+    jsonPath.write_text(json.dumps(SETTINGS), encoding="utf-8")
+    gamesPath = tmp_path / "games.json"
+    gamesPath.write_text(json.dumps(GAMES), encoding="utf-8")
+    return str(jsonPath), str(tmp_path / "settings.cache"), GameRegistry.load(str(gamesPath))
+
+
+def indexedGames(cachePath):
+    with open(cachePath, "rb") as f:
+        return sorted(pickle.load(f)["index"])
+
+
+def testOnlyRequestedGamesAreIndexed(paths):
+    jsonPath, cachePath, registry = paths
+    database = SettingsDatabase(jsonPath, cachePath, registry)
+    database.load(["Skyrim"])
+    assert indexedGames(cachePath) == ["skyrim"]
+
+    # a game that isn't indexed yet, like on the first display with lazy loading
+    sections = database.gameSections("enderal")
+    assert sorted(sections["Display"].keys()) == ["fGamma", "iSize W"]
+    assert "Fallout" not in sections
+    assert indexedGames(cachePath) == ["enderal", "skyrim"]
+
+
+def testCacheIsUsedWithoutReadingTheJson(paths, monkeypatch):
+    jsonPath, cachePath, registry = paths
+    SettingsDatabase(jsonPath, cachePath, registry).load(["skyrim"])
+    with open(cachePath, "rb") as f:
+        assert "settings" not in pickle.load(f)
+
+    def fail(database):
+        raise AssertionError("settings.json read although the cache has the index")
+    monkeypatch.setattr(SettingsDatabase, "settings", fail)
+    database = SettingsDatabase(jsonPath, cachePath, registry)
+    database.load(["skyrim"])
+    setting = database.gameSections("skyrim")["display"]["isize w"]
+    assert (setting.default, setting.file) == (640, "skyrimprefs.ini")
+
+
+def testChangedJsonRebuildsTheIndex(paths):
+    jsonPath, cachePath, registry = paths
+    SettingsDatabase(jsonPath, cachePath, registry).load(["skyrim"])
+    settings = json.loads(json.dumps(SETTINGS))
+    settings["Display"]["iSize W"]["default"] = 1280
+    with open(jsonPath, "w", encoding="utf-8") as f:
+        f.write(json.dumps(settings) + "\n")
+    database = SettingsDatabase(jsonPath, cachePath, registry)
+    assert database.gameSections("skyrim")["Display"]["iSize W"].default == 1280
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="files have no owner")
+def testCacheWritableByOthersIsIgnored(paths, caplog):
+    jsonPath, cachePath, registry = paths
+    SettingsDatabase(jsonPath, cachePath, registry).load(["skyrim"])
+    assert os.stat(cachePath).st_mode & 0o077 == 0
+    os.chmod(cachePath, 0o666)
+    SettingsDatabase(jsonPath, cachePath, registry).load(["skyrim"])
+    assert "writable by other users" in caplog.text
+    # replaced by a private one
+    assert os.stat(cachePath).st_mode & 0o077 == 0
+
+
+def testNoCacheIsWrittenWithoutCachePath(paths, tmp_path):
+    jsonPath, cachePath, registry = paths
+    database = SettingsDatabase(jsonPath, None, registry)
+    assert database.gameSections("skyrim")["Display"]["iSize W"].default == 640
+    assert sorted(os.listdir(str(tmp_path))) == ["games.json", "settings.json"]
+
+
+@pytest.fixture
+def searchIndex():
+    sections = {
+        "Display": [Setting("Display", "fDefaultWorldFOV", {"default": 75.0}, "skyrim.ini"),
+                    Setting("Display", "bFull Screen", {"default": True}, "skyrimprefs.ini")],
+        "General": [Setting("General", "uGridsToLoad", {"default": 5, "description": "Number of cells loaded"},
+                            "skyrim.ini")],
+    }
+    return SearchIndex(sections.items())
+
+
+def searchKeys(searchIndex, query):
+    return [setting.key for setting in searchIndex.search(query)]
+
+
+@pytest.mark.parametrize("query, keys", [
+    ("fDefaultWorldFOV", ["fDefaultWorldFOV"]),
+    ("uGridsToLoad", ["uGridsToLoad"]),
+    ("bFull", ["bFull Screen"]),
+    ("bFull Screen", ["bFull Screen"]),
+    ("defaultworldfov", ["fDefaultWorldFOV"]),
+    ("gridstoload", ["uGridsToLoad"]),
+    ("fov", ["fDefaultWorldFOV"]),
+    ("world fov", ["fDefaultWorldFOV"]),
+    ("display screen", ["bFull Screen"]),
+    ("cells loaded", ["uGridsToLoad"]),
+    ("display", ["fDefaultWorldFOV", "bFull Screen"]),
+    ("fov screen", []),
+    ("", []),
+])
+def testSearch(searchIndex, query, keys):
+    assert searchKeys(searchIndex, query) == keys
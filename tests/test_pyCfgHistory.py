@@ -0,0 +1,151 @@
+"""Undo, redo and restore of the changes recorded in a SettingsHistory, on ini files in a temporary profile"""
+
+import os
+
+import pytest
+
+import pyCfgHistory
+from pyCfgHistory import Change, SettingsHistory, HISTORY_DIRECTORY, STATE_FILE
+from pyCfgIni import patchIniFile
+
+ORIGINAL = b"[Display]\r\niSize W=1920\r\niSize H=1080\r\n[General]\r\nsLanguage=ENGLISH\r\n"
+
+
+@pytest.fixture
+def profile(tmp_path):
+    (tmp_path / "skyrim.ini").write_bytes(ORIGINAL)
+    return str(tmp_path)
+
+
+def readBytes(profile):
+    with open(os.path.join(profile, "skyrim.ini"), "rb") as f:
+        return f.read()
+
+
+def save(history, profile, changes, timestamp=None):
+    """writes changes to skyrim.ini like the configurator and records them"""
+    previous = patchIniFile(os.path.join(profile, "skyrim.ini"), changes)
+    return history.record([Change("skyrim.ini", section, key, old, changes[section][key])
+                           for (section, key), old in previous.items()], timestamp)
+
+
+def makeHistory(profile, **kwargs):
+    return SettingsHistory(os.path.join(profile, HISTORY_DIRECTORY), **kwargs)
+
+
+def testUndoAndRedoRoundTrip(profile):
+    history = makeHistory(profile)
+    save(history, profile, {"Display": {"iSize W": "1280"}})
+    saved = readBytes(profile)
+    assert (history.position(), history.canUndo(), history.canRedo()) == (1, True, False)
+
+    assert history.undo(profile) == [Change("skyrim.ini", "Display", "iSize W", "1280", "1920")]
+    assert readBytes(profile) == ORIGINAL
+    assert (history.position(), history.canUndo(), history.canRedo()) == (0, False, True)
+    assert history.undo(profile) == []
+
+    assert history.redo(profile) == [Change("skyrim.ini", "Display", "iSize W", "1920", "1280")]
+    assert readBytes(profile) == saved
+    assert history.redo(profile) == []
+
+
+def testUndoRemovesAddedKeys(profile):
+    history = makeHistory(profile)
+    entry = save(history, profile, {"Display": {"bFull Screen": "1"}, "Grass": {"iMinGrassSize": "60"}})
+    assert sorted((change.key, change.old) for change in entry.changes) == [("bFull Screen", None),
+                                                                           ("iMinGrassSize", None)]
+    history.undo(profile)
+    content = readBytes(profile)
+    assert b"bFull Screen" not in content and b"iMinGrassSize" not in content
+
+
+def testRecordDropsUndoneEntries(profile):
+    history = makeHistory(profile)
+    save(history, profile, {"Display": {"iSize W": "1280"}})
+    save(history, profile, {"Display": {"iSize W": "800"}})
+    history.undo(profile)
+    entry = save(history, profile, {"Display": {"iSize H": "720"}})
+
+    assert [len(item.changes) for item in history.entries()] == [1, 1]
+    assert history.entries()[-1] == entry
+    assert entry.id == 2
+    assert not history.canRedo()
+    assert [len(item.changes) for item in makeHistory(profile).entries()] == [1, 1]
+
+
+def testPruneKeepsTheNewestEntries(profile):
+    history = makeHistory(profile, maxEntries=2, maxBytes=0)
+    for width in ("1280", "1024", "800"):
+        save(history, profile, {"Display": {"iSize W": width}})
+    assert [entry.id for entry in history.entries()] == [2, 3]
+    assert history.position() == 2
+
+    # the oldest remaining entry can still be undone, the pruned one can't
+    history.undo(profile)
+    history.undo(profile)
+    assert not history.canUndo()
+    assert b"iSize W=1280\r\n" in readBytes(profile)
+
+
+def testPruneBySize(profile):
+    history = makeHistory(profile, maxEntries=0, maxBytes=1)
+    for width in ("1280", "1024", "800"):
+        save(history, profile, {"Display": {"iSize W": width}})
+    # always keeps the newest entry, even if it is larger than the limit
+    assert [entry.id for entry in history.entries()] == [3]
+    assert history.size() > 1
+
+
+def testPruneByTotalSize(profile):
+    history = makeHistory(profile, maxEntries=0, maxBytes=0)
+    for width, timestamp in (("1280", 100.0), ("1024", 200.0)):
+        save(history, profile, {"Display": {"iSize W": width}}, timestamp)
+    size = history.size()
+    # room for two entries of the same size
+    history = makeHistory(profile, maxEntries=0, maxBytes=size)
+    save(history, profile, {"Display": {"iSize W": "1600"}}, 300.0)
+    assert [entry.id for entry in history.entries()] == [2, 3]
+    assert history.size() == size
+
+
+def testRestoreWritesEachKeyOnce(profile, monkeypatch):
+    history = makeHistory(profile)
+    save(history, profile, {"Display": {"iSize W": "1280"}}, 100.0)
+    save(history, profile, {"Display": {"iSize W": "1024", "iSize H": "768"}}, 200.0)
+    save(history, profile, {"Display": {"iSize W": "800"}}, 300.0)
+
+    patched = []
+
+    def patch(path, changes):
+        patched.append(changes)
+        return patchIniFile(path, changes)
+    monkeypatch.setattr(pyCfgHistory, "patchIniFile", patch)
+
+    history.restore(profile, 100.0)
+    assert patched == [{"Display": {"iSize W": "1280", "iSize H": "1080"}}]
+    assert history.position() == 1
+    assert readBytes(profile) == ORIGINAL.replace(b"1920", b"1280")
+
+    del patched[:]
+    history.restore(profile, 250.0)
+    assert patched == [{"Display": {"iSize W": "1024", "iSize H": "768"}}]
+    assert history.position() == 2
+
+    history.restore(profile, 0.0)
+    assert readBytes(profile) == ORIGINAL
+    assert history.position() == 0
+
+
+def testPositionIsReloaded(profile):
+    history = makeHistory(profile)
+    for width in ("1280", "1024", "800"):
+        save(history, profile, {"Display": {"iSize W": width}})
+    history.undo(profile)
+    assert os.path.exists(os.path.join(history.path(), STATE_FILE))
+
+    reloaded = makeHistory(profile)
+    assert [entry.id for entry in reloaded.entries()] == [1, 2, 3]
+    assert (reloaded.position(), reloaded.canRedo()) == (2, True)
+    reloaded.redo(profile)
+    assert b"iSize W=800\r\n" in readBytes(profile)
+    assert makeHistory(profile).position() == 3
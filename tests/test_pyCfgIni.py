@@ -0,0 +1,125 @@
+"""Round trips through patchIniFile: writing the values a file already has, or writing changes and then the
+previous values it returns, has to leave the file byte for byte as it was"""
+
+import os
+import collections
+
+import pytest
+
+import pyCfgIni
+from pyCfgIni import parseIniFile, patchIniFile
+
+SAMPLES = {
+    "crlf": b"[Display]\r\niSize W=1920\r\niSize H=1080\r\n\r\n[General]\r\nsLanguage=ENGLISH\r\n",
+    "lf": b"[Display]\niSize W=1920\niSize H=1080\n[General]\nsLanguage=ENGLISH\n",
+    "noFinalNewline": b"[Display]\r\niSize W=1920\r\niSize H=1080",
+    "bom": b"\xef\xbb\xbf[Display]\r\niSize W=1920\r\niSize H=1080\r\n",
+    "comments": b"; written by the launcher\r\n[Display]\r\niSize W = 1920 ; width\r\n# hash comment\r\n"
+                b"iSize H=1080 // height\r\n\r\n; trailing comment\r\n",
+    "cp1252": b"[General]\r\nsLanguage=ENGLISH\r\nsIntroSequence=caf\xe9\r\n",
+    "duplicateSection": b"[Display]\r\niSize W=1920\r\n[General]\r\nsLanguage=ENGLISH\r\n[Display]\r\n"
+                        b"iSize H=720\r\n",
+    "duplicateKey": b"[Display]\r\niSize W=1920\r\niSize W=1920\r\n",
+}
+
+
+def writeSample(tmp_path, content):
+    path = str(tmp_path / "test.ini")
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+def readBytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def currentValues(path):
+    changes = {}
+    for record in parseIniFile(path):
+        changes.setdefault(record.section, {})[record.key] = record.text
+    return changes
+
+
+@pytest.mark.parametrize("name", sorted(SAMPLES))
+def testNoOpPatchIsByteIdentical(tmp_path, name):
+    path = writeSample(tmp_path, SAMPLES[name])
+    patchIniFile(path, currentValues(path))
+    assert readBytes(path) == SAMPLES[name]
+
+
+# appending a key to a file without a final line ending adds one, which reverting doesn't take back, and a
+# section that only existed for the reverted keys stays as an empty header
+@pytest.mark.parametrize("name", sorted(set(SAMPLES) - {"noFinalNewline"}))
+def testPatchAndRevertIsByteIdentical(tmp_path, name):
+    path = writeSample(tmp_path, SAMPLES[name])
+    changes = {section: {key: "42" for key in values} for section, values in currentValues(path).items()}
+    next(iter(changes.values()))["iNewSetting"] = "7"
+    previous = patchIniFile(path, changes)
+    assert readBytes(path) != SAMPLES[name]
+
+    reverted = {}
+    for (section, key), text in previous.items():
+        reverted.setdefault(section, {})[key] = text
+    patchIniFile(path, reverted)
+    assert readBytes(path) == SAMPLES[name]
+
+
+def testEmptyChangesDontTouchTheFile(tmp_path):
+    path = writeSample(tmp_path, SAMPLES["crlf"])
+    os.utime(path, ns=(0, 0))
+    assert patchIniFile(path, {}) == {}
+    assert os.stat(path).st_mtime_ns == 0
+
+
+def testChangedLinesKeepSpacingAndComments(tmp_path):
+    path = writeSample(tmp_path, SAMPLES["comments"])
+    previous = patchIniFile(path, {"display": {"isize w": "1280", "iSize H": "720"}})
+    assert previous == {("display", "isize w"): "1920", ("display", "iSize H"): "1080"}
+    assert readBytes(path) == b"; written by the launcher\r\n[Display]\r\niSize W = 1280 ; width\r\n" \
+                              b"# hash comment\r\niSize H=720 // height\r\n\r\n; trailing comment\r\n"
+
+
+def testMissingKeysAndSectionsAreAppended(tmp_path):
+    path = writeSample(tmp_path, SAMPLES["crlf"])
+    previous = patchIniFile(path, {"Display": {"iNewSetting": "1"}, "Audio": {"fVolume": "0.5"}})
+    assert previous == {("Display", "iNewSetting"): None, ("Audio", "fVolume"): None}
+    assert readBytes(path) == b"[Display]\r\niSize W=1920\r\niSize H=1080\r\niNewSetting=1\r\n\r\n" \
+                              b"[General]\r\nsLanguage=ENGLISH\r\n\r\n[Audio]\r\nfVolume=0.5\r\n"
+
+
+def testNoneRemovesKeys(tmp_path):
+    path = writeSample(tmp_path, SAMPLES["crlf"])
+    previous = patchIniFile(path, {"Display": {"iSize H": None, "iMissing": None}})
+    assert previous == {("Display", "iSize H"): "1080", ("Display", "iMissing"): None}
+    assert readBytes(path) == b"[Display]\r\niSize W=1920\r\n\r\n[General]\r\nsLanguage=ENGLISH\r\n"
+
+
+def testKeyInLaterOccurrenceOfSectionIsReplacedThere(tmp_path):
+    path = writeSample(tmp_path, SAMPLES["duplicateSection"])
+    previous = patchIniFile(path, {"Display": {"iSize H": "1080"}})
+    assert previous == {("Display", "iSize H"): "720"}
+    assert readBytes(path) == b"[Display]\r\niSize W=1920\r\n[General]\r\nsLanguage=ENGLISH\r\n[Display]\r\n" \
+                              b"iSize H=1080\r\n"
+    assert [(record.section, record.key) for record in parseIniFile(path)].count(("Display", "iSize H")) == 1
+
+
+def testDuplicateKeysAreAllReplaced(tmp_path):
+    path = writeSample(tmp_path, SAMPLES["duplicateKey"])
+    patchIniFile(path, {"Display": {"iSize W": "800"}})
+    assert readBytes(path) == b"[Display]\r\niSize W=800\r\niSize W=800\r\n"
+
+
+def testParseCacheKeepsOnlyTheMostRecentFiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(pyCfgIni, "PARSE_CACHE_SIZE", 2)
+    monkeypatch.setattr(pyCfgIni, "_parseCache", collections.OrderedDict())
+    paths = [str(tmp_path / "{0}.ini".format(index)) for index in range(3)]
+    for path in paths:
+        with open(path, "wb") as f:
+            f.write(SAMPLES["crlf"])
+    parseIniFile(paths[0])
+    parseIniFile(paths[1])
+    parseIniFile(paths[0])
+    parseIniFile(paths[2])
+    assert list(pyCfgIni._parseCache) == [paths[0], paths[2]]
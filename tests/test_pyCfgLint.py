@@ -0,0 +1,126 @@
+"""Validation of whole ini files against the settings of a game"""
+
+import os
+import json
+
+import pytest
+
+from pyCfgDatabase import GameRegistry, SettingsDatabase
+from pyCfgIni import parseIniFile
+from pyCfgLint import UNEXPECTED_SECTION, UNKNOWN_SETTING, WRONG_FILE, INVALID_VALUE, OUT_OF_RANGE,\
+    DUPLICATE_SETTING, IniIssue, validateIniRecords, describeIssue, issueToJson
+import pyCfgBatch
+
+CONTENT = (b"[Display]\r\n"
+           b"iSize W=1280\r\n"
+           b"fGamma=1.2\r\n"
+           b"iShadowMode=4\r\n"
+           b"iShadowMode=2\r\n"
+           b"[General]\r\n"
+           b"uGridsToLoad=13\r\n"
+           b"uExterior Cell Buffer=-1\r\n"
+           b"fDefaultFOV=wide\r\n"
+           b"sUnknown=1\r\n"
+           b"sLanguage=GERMAN\r\n"
+           b"[Unknown]\r\n"
+           b"bSomething=1\r\n")
+
+
+@pytest.fixture
+def settings(gameData):
+    registry = GameRegistry.load(os.path.join(os.path.dirname(gameData), "games.json"))
+    return SettingsDatabase(gameData, None, registry).gameSections("skyrim")
+
+
+def validate(settings, tmp_path, fileName, content=CONTENT, anyFile=False):
+    path = tmp_path / fileName
+    path.write_bytes(content)
+    return validateIniRecords(settings, fileName, parseIniFile(str(path)), anyFile)
+
+
+def testEachProblemIsReported(settings, tmp_path):
+    issues, accepted = validate(settings, tmp_path, "skyrim.ini")
+    assert [(issue.problem, issue.section, issue.key, issue.line, issue.expected) for issue in issues] == [
+        (WRONG_FILE, "Display", "iSize W", 1, "skyrimprefs.ini"),
+        (OUT_OF_RANGE, "Display", "iShadowMode", 3, "1, 2, 3"),
+        (DUPLICATE_SETTING, "Display", "iShadowMode", 4, 3),
+        (OUT_OF_RANGE, "General", "uGridsToLoad", 6, "1 - 11"),
+        (INVALID_VALUE, "General", "uExterior Cell Buffer", 7, None),
+        (INVALID_VALUE, "General", "fDefaultFOV", 8, None),
+        (UNKNOWN_SETTING, "General", "sUnknown", 9, None),
+        (UNEXPECTED_SECTION, "Unknown", "bSomething", 12, None),
+    ]
+    assert all(issue.file == "skyrim.ini" for issue in issues)
+    # values of the wrong file or out of range are still used, invalid ones aren't
+    assert [(setting.key, record.value) for setting, record in accepted] == [
+        ("iSize W", 1280), ("fGamma", 1.2), ("iShadowMode", 4), ("iShadowMode", 2), ("uGridsToLoad", 13),
+        ("sLanguage", "GERMAN")]
+
+
+def testSettingsOfBothFilesAreAcceptedInEither(settings, tmp_path):
+    content = b"[Display]\r\nfGamma=1.2\r\n"
+    assert validate(settings, tmp_path, "skyrimprefs.ini", content)[0] == []
+    assert validate(settings, tmp_path, "SKYRIM.INI", content)[0] == []
+
+
+def testCustomFilesMaySetAnySetting(settings, tmp_path):
+    issues = validate(settings, tmp_path, "skyrimcustom.ini", anyFile=True)[0]
+    assert WRONG_FILE not in [issue.problem for issue in issues]
+    assert len(issues) == 7
+
+
+def testFileNamesAreCaseInsensitive(settings, tmp_path):
+    issues = validate(settings, tmp_path, "SkyrimPrefs.ini", b"[display]\r\nisize w=1280\r\n")[0]
+    assert issues == []
+
+
+def testDescriptions(settings, tmp_path):
+    issues = validate(settings, tmp_path, "skyrim.ini")[0]
+    assert [describeIssue(issue) for issue in issues] == [
+        "skyrim.ini:2: [Display] iSize W: belongs in skyrimprefs.ini",
+        "skyrim.ini:4: [Display] iShadowMode: 4 is outside of 1, 2, 3",
+        "skyrim.ini:5: [Display] iShadowMode: duplicate of line 4",
+        "skyrim.ini:7: [General] uGridsToLoad: 13 is outside of 1 - 11",
+        "skyrim.ini:8: [General] uExterior Cell Buffer: invalid value -1",
+        "skyrim.ini:9: [General] fDefaultFOV: invalid value wide",
+        "skyrim.ini:10: [General] sUnknown: unknown setting",
+        "skyrim.ini:13: [Unknown] bSomething: unexpected section Unknown",
+    ]
+
+
+def testIssueToJson():
+    issue = IniIssue(INVALID_VALUE, "skyrim.ini", "General", "fDefaultFOV", 8, "wide", None)
+    assert issueToJson(issue) == {
+        "problem": "invalid value", "file": "skyrim.ini", "section": "General", "key": "fDefaultFOV", "line": 8,
+        "text": "wide", "expected": None, "severity": "error",
+        "message": "skyrim.ini:9: [General] fDefaultFOV: invalid value wide"}
+    assert issueToJson(issue._replace(problem=OUT_OF_RANGE))["severity"] == "warning"
+
+
+def testLintPrintsJson(gameData, tmp_path, capsys):
+    profiles = []
+    for name, content in (("clean", b"[General]\r\nuGridsToLoad=7\r\n"), ("broken", CONTENT)):
+        profile = tmp_path / name
+        profile.mkdir()
+        (profile / "skyrim.ini").write_bytes(content)
+        profiles.append(str(profile))
+
+    code = pyCfgBatch.main(["--settings", gameData, "--cache", "", "--game", "skyrim", "lint", "--json"] + profiles)
+    output = json.loads(capsys.readouterr().out)
+    assert code == 1
+    assert sorted(output) == sorted(profiles)
+    assert output[profiles[0]] == []
+    assert len(output[profiles[1]]) == 8
+    for issue in output[profiles[1]]:
+        assert sorted(issue) == ["expected", "file", "key", "line", "message", "problem", "section", "severity",
+                                 "text"]
+    assert output[profiles[1]][4]["severity"] == "error"
+    assert output[profiles[1]][4]["key"] == "uExterior Cell Buffer"
+    assert output[profiles[1]][0]["expected"] == "skyrimprefs.ini"
+
+
+def testLintWithoutInvalidValuesSucceeds(gameData, tmp_path, capsys):
+    (tmp_path / "skyrim.ini").write_bytes(b"[Display]\r\niSize W=1280\r\n")
+    code = pyCfgBatch.main(["--settings", gameData, "--cache", "", "--game", "skyrim", "lint", str(tmp_path)])
+    assert code == 0
+    assert "1 problem(s)" in capsys.readouterr().out